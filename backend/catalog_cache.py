@@ -0,0 +1,223 @@
+"""
+In-memory cache of the storefront content.
+
+Categories, products, hero slides, testimonials, gift boxes and site settings
+are read on every storefront page load but only change when an admin edits
+them. Each collection is loaded and JSON-encoded once and served from memory
+until a write invalidates it; every invalidation bumps that collection's version so stale
+loads can never be stored and combined snapshots know when to rebuild.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import time
+import uuid
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+def encode_json(data) -> bytes:
+    """Compact UTF-8 JSON encoding used for every cached body"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the encoded body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class Snapshot:
+    """Encoded payload plus its validator"""
+
+    def __init__(self, data, last_modified: float = None, etag: str = None):
+        self.data = data
+        self.body = encode_json(data)
+        self.etag = etag or make_etag(self.body)
+        self.last_modified = last_modified
+        self._gzip_body = None
+
+    @property
+    def gzip_body(self) -> bytes:
+        """Gzipped body, compressed once on first use"""
+        if self._gzip_body is None:
+            self._gzip_body = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzip_body
+
+
+class CatalogCache:
+    """Versioned per-collection cache with write-through invalidation"""
+
+    def __init__(self):
+        self._loaders = {}
+        self._values = {}
+        self._snapshots = {}
+        self._derived = {}
+        self._versions = {}
+        self._modified = {}
+        self._locks = {}
+        self._hits = {}
+        self._misses = {}
+        self._bootstrap = None
+        self._bootstrap_versions = None
+        self._bootstrap_lock = asyncio.Lock()
+        # Versions are counted per process, so validators derived from them carry this too
+        self._instance = uuid.uuid4().hex
+
+    def register(self, key, loader):
+        """Register an async loader returning the JSON-ready value for `key`"""
+        self._loaders[key] = loader
+        self._versions[key] = 0
+        self._modified[key] = time.time()
+        self._locks[key] = asyncio.Lock()
+        self._hits[key] = 0
+        self._misses[key] = 0
+
+    def invalidate(self, *keys):
+        """Drop the cached value of `keys` (all collections when none are given)"""
+        for key in keys or tuple(self._loaders):
+            self._versions[key] += 1
+            self._modified[key] = time.time()
+            self._values.pop(key, None)
+            self._snapshots.pop(key, None)
+            self._derived.pop(key, None)
+
+    def version(self, key) -> int:
+        return self._versions[key]
+
+    def validator(self, key, *parts) -> str:
+        """ETag for a response computed from `key` and the request `parts`, known before any query runs"""
+        state = encode_json([self._instance, key, self._versions[key], parts])
+        return '"' + hashlib.sha256(state).hexdigest()[:32] + '"'
+
+    def last_modified(self, key) -> float:
+        """Time of the last write to `key` (or of startup if never written)"""
+        return self._modified[key]
+
+    async def get(self, key):
+        """Return the cached value for `key`, loading it on a miss"""
+        if key in self._values:
+            self._hits[key] += 1
+            return self._values[key]
+
+        async with self._locks[key]:
+            if key in self._values:
+                self._hits[key] += 1
+                return self._values[key]
+
+            self._misses[key] += 1
+            version = self._versions[key]
+            value = await self._loaders[key]()
+            # A write that landed while we were loading makes this value stale
+            if version == self._versions[key]:
+                self._values[key] = value
+            return value
+
+    async def snapshot(self, key) -> Snapshot:
+        """Encoded body of a single collection, rebuilt only after it changes"""
+        version = self._versions[key]
+        cached = self._snapshots.get(key)
+        if cached is not None and cached[0] == version:
+            self._hits[key] += 1
+            return cached[1]
+
+        modified = self._modified[key]
+        snapshot = Snapshot(await self.get(key), modified)
+        if version == self._versions[key]:
+            self._snapshots[key] = (version, snapshot)
+        return snapshot
+
+    async def derived(self, key, name, build):
+        """Memoize `build(value)` under `name` for the current version of `key`
+
+        Used for lookup maps and per-item snapshots, which are thrown away
+        together with the collection on invalidation.
+        """
+        version = self._versions[key]
+        entries = self._derived.get(key)
+        if entries is not None and name in entries:
+            self._hits[key] += 1
+            return entries[name]
+
+        result = build(await self.get(key))
+        if version == self._versions[key]:
+            self._derived.setdefault(key, {})[name] = result
+        return result
+
+    async def bootstrap(self) -> Snapshot:
+        """Return the combined snapshot of every collection"""
+        versions = tuple(self._versions.values())
+        if self._bootstrap is not None and self._bootstrap_versions == versions:
+            return self._bootstrap
+
+        async with self._bootstrap_lock:
+            versions = tuple(self._versions.values())
+            if self._bootstrap is not None and self._bootstrap_versions == versions:
+                return self._bootstrap
+
+            keys = list(self._loaders)
+            modified = max(self._modified.values())
+            values = await asyncio.gather(*(self.get(key) for key in keys))
+            snapshot = Snapshot(dict(zip(keys, values)), modified)
+            if versions == tuple(self._versions.values()):
+                self._bootstrap = snapshot
+                self._bootstrap_versions = versions
+            logger.info(f"Built storefront snapshot {snapshot.etag} ({len(snapshot.body)} bytes)")
+            return snapshot
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current version of every collection"""
+        return {
+            key: {
+                "hits": self._hits[key],
+                "misses": self._misses[key],
+                "version": self._versions[key],
+                "cached": key in self._values,
+            }
+            for key in self._loaders
+        }
+
+
+def gzip_etag(etag: str) -> str:
+    """ETag of the gzipped representation of a body tagged `etag`"""
+    return etag[:-1] + '-gzip"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag
+
+    Tags of the gzipped representation (see gzip_etag) match their identity
+    counterpart, so either form revalidates the same content.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.endswith('-gzip"'):
+            candidate = candidate[:-6] + '"'
+        if candidate == target:
+            return True
+    return False
+
+
+def not_modified(headers, etag: str, last_modified: float = None) -> bool:
+    """Evaluate If-None-Match from request `headers`, falling back to If-Modified-Since"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
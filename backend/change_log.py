@@ -0,0 +1,168 @@
+"""
+Revision counter and change log of the storefront content.
+
+Every content write bumps a store-wide revision, kept in the `counters`
+collection, and appends one small entry to `change_log`:
+
+    {"rev": 42, "key": "products", "op": "upsert", "ids": ["..."], "at": ...}
+
+`op` is "upsert" or "delete" for the listed ids, or "reset" when a whole
+collection was replaced (imports and reseeds). Entries hold ids only; the
+documents themselves are read back when changes are exported, so the log
+stays small.
+
+`changes_since(rev)` folds the entries after `rev` into the final state of
+each id. Writers take their revision before inserting their entry, so for a
+moment a higher revision may be logged while a lower one is still missing.
+The walk therefore stops at the first gap and reports the revision before
+it, unless the gap is older than `settle_seconds` (a writer that died
+before logging). Entries older than the retention period are pruned, and a
+request for changes from before the pruned range gets a 410.
+
+`follow()` polls the revision so that a replica hears of the writes made by
+the others and can drop its in-memory caches of those collections.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+REVISION_ID = "content_revision"
+
+
+class RevisionExpired(HTTPException):
+    """Raised when the entries after the requested revision were pruned"""
+
+    def __init__(self, floor: int):
+        super().__init__(
+            status_code=410,
+            detail=f"Changes before revision {floor} are no longer kept, fetch a full export",
+        )
+
+
+class ChangeLog:
+    """Store-wide content revision plus the log of what each revision changed"""
+
+    def __init__(self, db, retention_days: float = 30, settle_seconds: float = 60):
+        self.counters = db.counters
+        self.entries = db.change_log
+        self.retention = timedelta(days=retention_days)
+        self.settle = timedelta(seconds=settle_seconds)
+        # Revisions of this process's own writes, tracked while follow() runs
+        self._own = None
+
+    async def record(self, key: str, op: str, ids=()) -> int:
+        """Log that `op` was applied to `ids` of the collection `key`; returns the new revision"""
+        counter = await self.counters.find_one_and_update(
+            {"_id": REVISION_ID}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        revision = counter["value"]
+        if self._own is not None:
+            self._own.add(revision)
+        await self.entries.insert_one({
+            "rev": revision, "key": key, "op": op, "ids": list(ids), "at": datetime.now(timezone.utc),
+        })
+        return revision
+
+    async def _counter(self) -> dict:
+        return await self.counters.find_one({"_id": REVISION_ID}) or {}
+
+    async def revision(self) -> int:
+        """Latest revision handed out (0 before the first write)"""
+        return (await self._counter()).get("value", 0)
+
+    async def changes_since(self, since: int):
+        """(revision, changes) for the writes after `since`
+
+        `changes` maps collection keys to {"reset", "upserted", "deleted"},
+        the last two being sets of ids. `revision` is where the next call
+        should continue from.
+        """
+        revision = since
+        changes = {}
+        async for entry in self._entries_since(since):
+            revision = entry["rev"]
+            change = changes.setdefault(entry["key"], {"reset": False, "upserted": set(), "deleted": set()})
+            if entry["op"] == "reset":
+                change.update(reset=True, upserted=set(), deleted=set())
+            elif entry["op"] == "upsert":
+                change["upserted"].update(entry["ids"])
+                change["deleted"].difference_update(entry["ids"])
+            else:
+                change["deleted"].update(entry["ids"])
+                change["upserted"].difference_update(entry["ids"])
+        return revision, changes
+
+    async def _entries_since(self, since: int):
+        """Entries after `since` in order, up to the first gap that may still be filled"""
+        floor = (await self._counter()).get("floor", 0)
+        if since < floor:
+            raise RevisionExpired(floor)
+
+        revision = since
+        settled = datetime.now(timezone.utc) - self.settle
+        async for entry in self.entries.find({"rev": {"$gt": since}}, {"_id": 0}).sort("rev", 1):
+            at = entry["at"]
+            if at.tzinfo is None:
+                at = at.replace(tzinfo=timezone.utc)
+            if entry["rev"] != revision + 1 and at > settled:
+                # A concurrent write has its revision but has not logged it yet
+                break
+            revision = entry["rev"]
+            yield entry
+
+    async def follow(self, on_change, interval: float):
+        """Call `on_change(keys)` for the writes of other processes, polling every `interval` seconds
+
+        `keys` is the set of collection keys those writes touched, or None
+        when the entries were pruned and anything may have changed. Runs
+        until cancelled.
+        """
+        self._own = set()
+        seen = None
+        while True:
+            try:
+                if seen is None:
+                    seen = await self.revision()
+                elif await self.revision() != seen:
+                    revision, keys = seen, set()
+                    try:
+                        async for entry in self._entries_since(seen):
+                            revision = entry["rev"]
+                            if revision not in self._own:
+                                keys.add(entry["key"])
+                    except RevisionExpired:
+                        revision, keys = await self.revision(), None
+                    seen = revision
+                    self._own = {rev for rev in self._own if rev > seen}
+                    if keys is None or keys:
+                        on_change(keys)
+            except Exception as e:
+                logger.error(f"Following the change log failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def prune(self) -> int:
+        """Drop entries older than the retention period; returns how many were removed"""
+        cutoff = datetime.now(timezone.utc) - self.retention
+        newest = await self.entries.find_one({"at": {"$lt": cutoff}}, {"rev": 1}, sort=[("rev", -1)])
+        if newest is None:
+            return 0
+        result = await self.entries.delete_many({"rev": {"$lte": newest["rev"]}})
+        await self.counters.update_one({"_id": REVISION_ID}, {"$max": {"floor": newest["rev"]}}, upsert=True)
+        return result.deleted_count
+
+    async def prune_forever(self, interval: float):
+        """Prune every `interval` seconds until cancelled"""
+        while True:
+            try:
+                removed = await self.prune()
+                if removed:
+                    logger.info(f"Pruned {removed} change log entries")
+            except Exception as e:
+                logger.error(f"Change log pruning failed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,90 @@
+"""
+Atomic replacement of whole collections.
+
+Imports and reseeds used to `delete_many({})` the live collection and then
+insert the new documents. Between the two the storefront saw an empty
+catalog, and a failure halfway left it half wiped. `CollectionSwap`
+instead loads the new documents into a shadow collection
+("products__staging") and builds its indexes there. It then renames the
+shadow over the live collection with `dropTarget`. The rename is a single
+atomic catalog operation, so readers see either the old documents or the
+new ones. If anything fails before the swap, the shadow collections are
+dropped and the live ones were never touched. Each collection is swapped
+atomically on its own; the renames of several collections follow each other
+within milliseconds but not as one transaction.
+"""
+
+import asyncio
+import logging
+
+from db_indexes import INDEXES, ensure_collection_indexes
+
+logger = logging.getLogger(__name__)
+
+STAGING_SUFFIX = "__staging"
+
+# One swap at a time: concurrent imports would share the staging collections
+_swap_lock = asyncio.Lock()
+
+
+class SwapFailed(Exception):
+    """The staged collections could not be made live; the live ones are unchanged"""
+
+
+class CollectionSwap:
+    """Async context manager that stages collections and swaps them in on success
+
+        async with CollectionSwap(db) as swap:
+            staging = await swap.stage("products")
+            await staging.insert_many(docs)
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._staged = {}
+
+    async def __aenter__(self):
+        await _swap_lock.acquire()
+        return self
+
+    async def stage(self, name: str):
+        """Empty shadow collection that will replace `name`"""
+        if name not in self._staged:
+            # Leftovers of an import that died before its swap
+            await self.db[name + STAGING_SUFFIX].drop()
+            await self.db.create_collection(name + STAGING_SUFFIX)
+            self._staged[name] = self.db[name + STAGING_SUFFIX]
+        return self._staged[name]
+
+    async def commit(self):
+        """Index every staged collection, then rename each over its live counterpart"""
+        for name, staging in self._staged.items():
+            expected = len(INDEXES.get(name, []))
+            if await ensure_collection_indexes(staging, name) < expected:
+                raise SwapFailed(f"Could not build the indexes of {name}, see the log")
+        for name, staging in self._staged.items():
+            await staging.rename(name, dropTarget=True)
+            logger.info(f"Swapped {staging.name} into {name}")
+        self._staged = {}
+
+    async def discard(self):
+        """Drop the staged collections, leaving the live ones as they are"""
+        for staging in self._staged.values():
+            try:
+                await staging.drop()
+            except Exception as e:
+                logger.error(f"Could not drop {staging.name}: {e}")
+        self._staged = {}
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                try:
+                    await self.commit()
+                except BaseException:
+                    await self.discard()
+                    raise
+            else:
+                await self.discard()
+        finally:
+            _swap_lock.release()
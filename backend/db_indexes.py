@@ -0,0 +1,112 @@
+"""
+Declarative MongoDB index registry.
+
+Every lookup the API performs by `id`, `slug`, `email` or `createdAt` is
+backed by an index declared here. `ensure_indexes` is idempotent: creating an
+index that already exists with the same spec is a no-op, so it runs on every
+startup.
+"""
+
+import logging
+import time
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+def _unique_id():
+    return IndexModel([("id", ASCENDING)], unique=True)
+
+
+INDEXES = {
+    "categories": [
+        _unique_id(),
+        IndexModel([("slug", ASCENDING)]),
+    ],
+    "products": [
+        _unique_id(),
+        IndexModel([("slug", ASCENDING)], unique=True),
+        IndexModel([("sku", ASCENDING)], unique=True),
+        # Every product sort ends with the _id tie-breaker, so the indexes do too
+        IndexModel([("category", ASCENDING), ("basePrice", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("type", ASCENDING), ("basePrice", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("basePrice", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "hero_slides": [_unique_id()],
+    "testimonials": [_unique_id()],
+    "gift_boxes": [_unique_id()],
+    "site_settings": [_unique_id()],
+    "bulk_orders": [
+        _unique_id(),
+        # Keyset pages of the admin listing, unfiltered and per filter
+        IndexModel([("createdAt", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("createdAt", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("productType", ASCENDING), ("createdAt", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "newsletter": [
+        _unique_id(),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("createdAt", DESCENDING)]),
+    ],
+    "status_checks": [_unique_id()],
+    "change_log": [
+        IndexModel([("rev", ASCENDING)], unique=True),
+        IndexModel([("at", ASCENDING)]),
+    ],
+}
+
+# Indexes an earlier registry created, superseded by the ones above
+OBSOLETE_INDEXES = {
+    "products": ["category_1_basePrice_1", "type_1_basePrice_1", "basePrice_1", "name_1"],
+}
+
+
+async def ensure_collection_indexes(collection, name: str = None) -> int:
+    """Create the registered indexes of `name` (defaults to the collection's own name) on `collection`
+
+    Each index is created on its own so that one failure, such as duplicate
+    keys in existing data, does not keep the others from being built.
+    Returns the number of indexes that are in place.
+    """
+    created = 0
+    for model in INDEXES.get(name or collection.name, []):
+        try:
+            await collection.create_indexes([model])
+            created += 1
+        except PyMongoError as e:
+            logger.error(f"Could not create index {model.document['name']} on {collection.name}: {e}")
+    return created
+
+
+async def drop_obsolete_indexes(collection):
+    """Drop the OBSOLETE_INDEXES of `collection` that still exist"""
+    obsolete = OBSOLETE_INDEXES.get(collection.name)
+    if not obsolete:
+        return
+    try:
+        existing = await collection.index_information()
+    except PyMongoError as e:
+        logger.error(f"Could not list the indexes of {collection.name}: {e}")
+        return
+    for name in obsolete:
+        if name in existing:
+            try:
+                await collection.drop_index(name)
+                logger.info(f"Dropped obsolete index {name} on {collection.name}")
+            except PyMongoError as e:
+                logger.error(f"Could not drop index {name} on {collection.name}: {e}")
+
+
+async def ensure_indexes(db):
+    """Ensure every registered index exists, logging the build time per collection"""
+    started = time.perf_counter()
+    for name in INDEXES:
+        collection_started = time.perf_counter()
+        created = await ensure_collection_indexes(db[name])
+        await drop_obsolete_indexes(db[name])
+        elapsed = (time.perf_counter() - collection_started) * 1000
+        logger.info(f"Ensured {created}/{len(INDEXES[name])} indexes on {name} in {elapsed:.1f} ms")
+    logger.info(f"Index provisioning finished in {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,156 @@
+"""
+Streaming exports of the form submissions and of the theme.
+
+Rows are read from a Mongo cursor in batches of `EXPORT_BATCH_SIZE` and
+written out as CSV or NDJSON while the cursor is still being iterated, so
+memory stays flat however many rows there are. Encoded rows are gathered
+into chunks of about `FLUSH_BYTES` to keep the number of writes low; the
+CSV header goes out on its own so the download starts at once.
+
+The theme export is written section by section from one cursor per
+collection, either as a single JSON document or as NDJSON records, and can
+be gzipped on the fly.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+
+from starlette.responses import StreamingResponse
+
+EXPORT_BATCH_SIZE = 1000
+
+FLUSH_BYTES = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+async def _close(cursor):
+    close = getattr(cursor, "close", None)
+    if close is not None:
+        result = close()
+        if hasattr(result, "__await__"):
+            await result
+
+
+async def stream_csv(cursor, fields: list):
+    """CSV chunks for the documents of `cursor`, one column per name in `fields`"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    try:
+        async for doc in cursor:
+            writer.writerow([_csv_value(doc.get(field)) for field in fields])
+            if buffer.tell() >= FLUSH_BYTES:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        await _close(cursor)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+async def _buffered(pieces):
+    """Join the strings of the async iterable `pieces` into UTF-8 chunks of about FLUSH_BYTES"""
+    chunk = []
+    size = 0
+    async for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= FLUSH_BYTES:
+            yield "".join(chunk).encode("utf-8")
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+async def _documents(cursor):
+    try:
+        async for doc in cursor:
+            yield doc
+    finally:
+        await _close(cursor)
+
+
+async def _ndjson_lines(cursor):
+    async for doc in _documents(cursor):
+        yield _dumps(doc) + "\n"
+
+
+def stream_ndjson(cursor):
+    """Newline-delimited JSON chunks for the documents of `cursor`"""
+    return _buffered(_ndjson_lines(cursor))
+
+
+async def _theme_json(header: dict, settings: dict, sections: list):
+    yield "{" + ",".join(f"{_dumps(key)}:{_dumps(value)}" for key, value in header.items())
+    yield ',"siteSettings":' + _dumps(settings)
+    for key, cursor in sections:
+        yield f",{_dumps(key)}:["
+        separator = "\n"
+        async for doc in _documents(cursor):
+            yield separator + _dumps(doc)
+            separator = ",\n"
+        yield "]"
+    yield "}\n"
+
+
+async def _theme_ndjson(header: dict, settings: dict, sections: list):
+    yield _dumps(header) + "\n"
+    yield _dumps({"collection": "siteSettings", "document": settings}) + "\n"
+    for key, cursor in sections:
+        async for doc in _documents(cursor):
+            yield _dumps({"collection": key, "document": doc}) + "\n"
+
+
+def stream_theme(header: dict, settings: dict, sections: list, fmt: str = "json"):
+    """Chunks of a theme export; `sections` is a list of (key, cursor)
+
+    "json" writes one object holding `header`, "siteSettings" and one array
+    per section, the layout import-theme accepts. "ndjson" writes `header`
+    on the first line, then one {"collection", "document"} record per line.
+    """
+    pieces = _theme_ndjson(header, settings, sections) if fmt == "ndjson" else _theme_json(header, settings, sections)
+    return _buffered(pieces)
+
+
+async def gzip_chunks(chunks, level: int = 6):
+    """Gzip the async byte stream `chunks` as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(cursor, fmt: str, fields: list, name: str) -> StreamingResponse:
+    """Attachment streaming `cursor` as `fmt` ("csv" or "ndjson")"""
+    body = stream_csv(cursor, fields) if fmt == "csv" else stream_ndjson(cursor)
+    filename = f"{name}_{datetime.now(timezone.utc):%Y-%m-%d}.{fmt}"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "private, no-store",
+    }
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[fmt], headers=headers)
@@ -0,0 +1,278 @@
+"""
+Responsive derivatives of uploaded images.
+
+After an image is uploaded, a process pool renders it at the widths listed in
+VARIANT_WIDTHS (never upscaling), both as WebP and in the original format.
+The results go to `variants/` in the upload storage together with a JSON
+manifest. `GET /api/uploads/{name}?w=300&fmt=webp` then serves the smallest
+variant that is at least as wide as requested, falling back to the original
+while the derivatives are still being rendered or when none are available.
+Uploads from before variants existed have no manifest; the first variant
+request for one of them renders its derivatives in the background.
+
+Pillow is optional: without it uploads work as before and no variants are
+made.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is an optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (100, 300, 600, 1200)
+VARIANT_FORMATS = ("webp", "original")
+VARIANT_DIR = "variants"
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+# A missing manifest is not looked up again in storage for this many seconds
+MISSING_MANIFEST_TTL = 30
+
+# Bound on the names remembered as missing or backfilled; requests can name any file
+MAX_TRACKED_NAMES = 10000
+
+# Formats Pillow renders variants in; animated GIFs are left alone
+_ORIGINAL_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+
+@contextmanager
+def _atomic_path(path: Path):
+    """Fresh hidden temp file next to `path`, moved over it once written
+
+    Every writer gets its own temp file, so concurrent renders never share one.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".part")
+    os.close(fd)
+    temp_path = Path(temp_path)
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def _save(image, path: Path, image_format: str):
+    if image_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or "A" in image.mode else "RGB")
+    with _atomic_path(path) as temp_path:
+        if image_format == "WEBP":
+            image.save(temp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+        elif image_format == "JPEG":
+            image.convert("RGB").save(temp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            image.save(temp_path, image_format, optimize=True)
+
+
+def render_variants(source: str, directory: str, name: str = None) -> dict:
+    """Render the derivatives of `source` into `directory` and write its manifest
+
+    `name` is the upload's file name when `source` is a temporary copy.
+    Runs in a worker process. Images in other formats (GIF, animations) get
+    a manifest without variants, so that requests for them stop waiting.
+    """
+    source = Path(source)
+    directory = Path(directory)
+    name = Path(name or source.name)
+    with Image.open(source) as opened:
+        image_format = opened.format
+        if image_format not in _ORIGINAL_FORMATS or getattr(opened, "is_animated", False):
+            return _write_manifest(directory, {"source": name.name, "variants": []})
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+
+    width, height = image.size
+    variants = []
+    for target in VARIANT_WIDTHS:
+        if target >= width:
+            break
+        resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+        for fmt in VARIANT_FORMATS:
+            pil_format = "WEBP" if fmt == "webp" else image_format
+            filename = f"{name.stem}-{target}.{_ORIGINAL_FORMATS[pil_format]}"
+            if fmt == "original" and pil_format == "WEBP":
+                continue  # the WebP rendering already covers it
+            _save(resized, directory / filename, pil_format)
+            variants.append({"width": target, "format": _ORIGINAL_FORMATS[pil_format], "file": filename})
+    if image_format != "WEBP":
+        filename = f"{name.stem}.webp"
+        _save(image, directory / filename, "WEBP")
+        variants.append({"width": width, "format": "webp", "file": filename})
+
+    manifest = {
+        "source": name.name,
+        "format": _ORIGINAL_FORMATS[image_format],
+        "width": width,
+        "height": height,
+        "variants": variants,
+    }
+    return _write_manifest(directory, manifest)
+
+
+def _write_manifest(directory: Path, manifest: dict) -> dict:
+    manifest_path = directory / f"{manifest['source']}.json"
+    with _atomic_path(manifest_path) as temp_path:
+        temp_path.write_text(json.dumps(manifest), encoding="utf-8")
+    return manifest
+
+
+def pick_variant(manifest: dict, width: int = None, fmt: str = None):
+    """File name of the best variant for `width`/`fmt`, or None to serve the original
+
+    Picks the narrowest variant at least `width` pixels wide in the requested
+    format ("webp", or the original's own format by default). Without a
+    width only a full-size rendering will do, since the others are smaller
+    than the original.
+    """
+    variants = manifest.get("variants") or []
+    wanted = fmt if fmt and fmt != "original" else manifest.get("format")
+    full_width = manifest.get("width")
+    width = full_width if width is None else min(width, full_width or width)
+    if width is None:
+        return None
+    candidates = sorted(
+        (v for v in variants if v["format"] == wanted and v["width"] >= width),
+        key=lambda v: v["width"],
+    )
+    return candidates[0]["file"] if candidates else None
+
+
+class ImageVariants:
+    """Schedules derivative rendering in a process pool and resolves variant requests
+
+    Variants are stored next to the uploads in `storage`, under VARIANT_DIR.
+    """
+
+    def __init__(self, storage, max_workers: int = None):
+        self.storage = storage
+        if storage.local_directory is not None:
+            (storage.local_directory / VARIANT_DIR).mkdir(exist_ok=True)
+        self.max_workers = max_workers
+        self._executor = None
+        self._manifests = {}
+        self._missing = {}
+        self._backfilled = set()
+        self._rendering = {}
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Not fork: the server already runs motor/pymongo threads whose locks a forked child would inherit
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._executor
+
+    async def _render_remote(self, filename: str) -> dict:
+        """Render from a downloaded copy into a temp directory, then upload the results"""
+        loop = asyncio.get_running_loop()
+        work_dir = Path(await asyncio.to_thread(tempfile.mkdtemp, dir=self.storage.staging_dir, prefix=".variants-"))
+        try:
+            async with self.storage.local_copy(filename) as source:
+                manifest = await loop.run_in_executor(
+                    self._pool(), render_variants, str(source), str(work_dir), filename
+                )
+            # The manifest goes last: once it exists, every variant it lists does too
+            files = [v["file"] for v in manifest.get("variants", [])] + [f"{filename}.json"]
+            for name in files:
+                await self.storage.store(str(work_dir / name), f"{VARIANT_DIR}/{name}", overwrite=True)
+            return manifest
+        finally:
+            await asyncio.to_thread(shutil.rmtree, work_dir, True)
+
+    async def render(self, filename: str) -> dict:
+        """Render the derivatives of the upload `filename` off the event loop"""
+        if not self.enabled:
+            return {}
+        loop = asyncio.get_running_loop()
+        try:
+            if self.storage.local_directory is not None:
+                root = self.storage.local_directory
+                manifest = await loop.run_in_executor(
+                    self._pool(), render_variants, str(root / filename), str(root / VARIANT_DIR)
+                )
+            else:
+                manifest = await self._render_remote(filename)
+        except Exception as e:
+            logger.error(f"Could not render variants of {filename}: {e}")
+            return {}
+        self._manifests[filename] = manifest
+        self._missing.pop(filename, None)
+        return manifest
+
+    async def manifest(self, filename: str) -> dict:
+        manifest = self._manifests.get(filename)
+        if manifest is None:
+            missing_since = self._missing.get(filename)
+            if missing_since is not None and time.monotonic() - missing_since < MISSING_MANIFEST_TTL:
+                return {}
+            try:
+                manifest = json.loads(await self.storage.read_bytes(f"{VARIANT_DIR}/{filename}.json") or b"{}")
+            except ValueError:
+                manifest = {}
+            if not manifest:
+                if len(self._missing) >= MAX_TRACKED_NAMES:
+                    self._missing.clear()
+                self._missing[filename] = time.monotonic()
+                return {}
+            self._missing.pop(filename, None)
+            self._manifests[filename] = manifest
+        return manifest
+
+    def schedule(self, filename: str):
+        """Render the upload `filename` in the background; joins a render of it already running"""
+        if not self.enabled:
+            return None
+        task = self._rendering.get(filename)
+        if task is None:
+            task = asyncio.create_task(self.render(filename))
+            self._rendering[filename] = task
+            task.add_done_callback(lambda _: self._rendering.pop(filename, None))
+        return task
+
+    def backfill(self, filename: str):
+        """Schedule the variants of an upload that has no manifest, once per file"""
+        if not self.enabled or filename in self._backfilled:
+            return None
+        if len(self._backfilled) >= MAX_TRACKED_NAMES:
+            self._backfilled.clear()
+        self._backfilled.add(filename)
+        return self.schedule(filename)
+
+    async def resolve(self, filename: str, width: int = None, fmt: str = None):
+        """(storage key of the variant to serve or None for the original, whether the variants are rendered yet)"""
+        if not self.enabled:
+            # No variants will ever come: the original is final
+            return None, True
+        manifest = await self.manifest(filename)
+        variant = pick_variant(manifest, width, fmt)
+        return (f"{VARIANT_DIR}/{variant}" if variant else None), bool(manifest)
+
+    def forget(self, filename: str) -> list:
+        """Drop the cached manifest of a deleted upload; returns the keys its variants had"""
+        self._missing.pop(filename, None)
+        self._backfilled.discard(filename)
+        manifest = self._manifests.pop(filename, None) or {}
+        return [f"{VARIANT_DIR}/{v['file']}" for v in manifest.get("variants", [])]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,59 @@
+"""
+Keyset (cursor) pagination helpers for Mongo queries.
+
+A cursor is the sort key of the last document of a page, so the next page is
+an index range scan that starts where the previous one stopped instead of a
+growing `skip()`. Every sort must end with a unique field (`_id` or `id`) so
+that the position is unambiguous.
+"""
+
+import base64
+import json
+
+from bson import ObjectId
+
+
+def encode_cursor(doc: dict, sort: list) -> str:
+    """Opaque cursor pointing just after `doc` in `sort` order"""
+    values = []
+    for field, _ in sort:
+        value = doc.get(field)
+        if isinstance(value, ObjectId):
+            value = {"$oid": str(value)}
+        values.append(value)
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: list) -> list:
+    """Sort key values stored in `cursor`; raises ValueError when malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise ValueError("Invalid cursor")
+    decoded = []
+    for value in values:
+        if isinstance(value, dict) and "$oid" in value:
+            try:
+                value = ObjectId(value["$oid"])
+            except Exception:
+                raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+
+def keyset_filter(sort: list, values: list) -> dict:
+    """Mongo condition selecting documents strictly after `values` in `sort` order
+
+    For sort [(a, 1), (b, 1)] and values [x, y] this is
+    {"$or": [{a: {"$gt": x}}, {a: x, b: {"$gt": y}}]}.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if direction == 1 else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
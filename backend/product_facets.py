@@ -0,0 +1,92 @@
+"""
+Facet counts for the storefront product filters.
+
+The product catalog is flattened into NumPy arrays once per catalog version
+(category and type codes, prices, lowercased search text). Each filter then
+becomes a boolean mask, and the counts are a `bincount` over the masked codes.
+No Mongo round trip is needed and no Python loop runs over the products.
+
+Facets are disjunctive: the category counts apply every filter except the
+category one, the type counts every filter except the type one, and so on.
+The sidebar can then show how many products each alternative would give.
+"""
+
+import numpy as np
+
+# Upper edges of the price buckets; the last bucket is open-ended
+PRICE_BUCKET_EDGES = (250.0, 500.0, 1000.0, 2000.0)
+
+
+class ProductFacets:
+    """Column arrays of the product catalog for vectorized facet counting"""
+
+    def __init__(self, products):
+        self.size = len(products)
+        self.prices = np.array([float(p.get("basePrice") or 0) for p in products], dtype=np.float64)
+        self.categories, self.category_codes = np.unique(
+            np.array([str(p.get("category", "")) for p in products], dtype=object), return_inverse=True
+        )
+        self.types, self.type_codes = np.unique(
+            np.array([str(p.get("type", "")) for p in products], dtype=object), return_inverse=True
+        )
+        # Same fields the product listing's `q` filter matches
+        self.search_text = np.array(
+            [f"{p.get('name', '')}\n{p.get('type', '')}\n{p.get('category', '')}".lower() for p in products],
+            dtype=str,
+        )
+        self.bucket_edges = np.array(PRICE_BUCKET_EDGES, dtype=np.float64)
+
+    def _code_mask(self, values, codes, value):
+        index = np.searchsorted(values, value)
+        if index < len(values) and values[index] == value:
+            return codes == index
+        return np.zeros(self.size, dtype=bool)
+
+    def facets(self, category=None, product_type=None, q=None, min_price=None, max_price=None) -> dict:
+        everything = np.ones(self.size, dtype=bool)
+        category_mask = self._code_mask(self.categories, self.category_codes, category) if category else everything
+        type_mask = self._code_mask(self.types, self.type_codes, product_type) if product_type else everything
+        q = (q or "").strip().lower()
+        text_mask = np.char.find(self.search_text, q) >= 0 if q and self.size else everything
+        price_mask = everything
+        if min_price is not None:
+            price_mask = price_mask & (self.prices >= min_price)
+        if max_price is not None:
+            price_mask = price_mask & (self.prices <= max_price)
+
+        selected = category_mask & type_mask & text_mask & price_mask
+        without_price = category_mask & type_mask & text_mask
+
+        category_counts = np.bincount(
+            self.category_codes[type_mask & text_mask & price_mask], minlength=len(self.categories)
+        )
+        type_counts = np.bincount(
+            self.type_codes[category_mask & text_mask & price_mask], minlength=len(self.types)
+        )
+        bucket_counts = np.bincount(
+            np.searchsorted(self.bucket_edges, self.prices[without_price], side="right"),
+            minlength=len(self.bucket_edges) + 1,
+        )
+        prices = self.prices[without_price]
+
+        lower_edges = (0.0,) + PRICE_BUCKET_EDGES
+        upper_edges = PRICE_BUCKET_EDGES + (None,)
+        return {
+            "total": int(selected.sum()),
+            "categories": [
+                {"value": value, "count": int(count)}
+                for value, count in zip(self.categories, category_counts) if count
+            ],
+            "types": [
+                {"value": value, "count": int(count)}
+                for value, count in zip(self.types, type_counts) if count
+            ],
+            "priceBuckets": [
+                {"min": low, "max": high, "count": int(count)}
+                for low, high, count in zip(lower_edges, upper_edges, bucket_counts)
+            ],
+            "price": {
+                "min": float(prices.min()) if prices.size else None,
+                "max": float(prices.max()) if prices.size else None,
+            },
+        }
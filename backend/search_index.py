@@ -0,0 +1,396 @@
+"""
+In-process full-text search over the product catalog.
+
+An inverted index maps every term to the products containing it, weighted by
+the field it appears in, and ranks matches with BM25. Query terms that are not
+in the vocabulary are corrected through a trigram index ("almnd" -> "almond")
+and the last query term is also expanded as a prefix so results show up while
+the user is still typing.
+
+Typeahead suggestions use a separate sorted array of phrases searched with
+bisect and ranked by how often each suggestion was used.
+"""
+
+import asyncio
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+
+# Relative importance of a term found in each product field
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "type": 2.0,
+    "shortDescription": 1.5,
+    "benefits": 1.0,
+    "description": 1.0,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Score multipliers for expanded query terms
+FUZZY_FACTORS = {1: 0.6, 2: 0.35}
+PREFIX_FACTOR = 0.5
+MAX_PREFIX_EXPANSIONS = 10
+MAX_FUZZY_EXPANSIONS = 3
+
+# Only the highest-impact postings of each term are scored, which bounds the
+# cost of very common terms; memoized expansions are capped at this many tokens
+MAX_POSTINGS_PER_TERM = 1000
+MAX_CACHED_EXPANSIONS = 10000
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "our", "that", "the", "this", "to", "with", "your",
+}
+
+
+def normalize_term(token: str) -> str:
+    """Light plural folding so 'almonds' and 'almond' share a term"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list:
+    return [normalize_term(token) for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def max_edits(term: str) -> int:
+    """Allowed typos for a term of this length (none below 3 characters)"""
+    if len(term) < 3:
+        return 0
+    return 1 if len(term) <= 5 else 2
+
+
+def trigrams(term: str) -> set:
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up early once it exceeds `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _field_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value or "")
+
+
+class SearchIndex:
+    """Inverted index with BM25 ranking, typo tolerance and prefix expansion"""
+
+    def __init__(self):
+        self._postings = {}      # term -> {doc_id: weighted term frequency}
+        self._doc_terms = {}     # doc_id -> {term: weighted term frequency}
+        self._doc_lengths = {}   # doc_id -> weighted length
+        self._total_length = 0.0
+        self._trigrams = {}      # trigram -> set of terms
+        self._sorted_terms = []
+        self._sorted_dirty = False
+        self._impacts = {}       # term -> [(BM25 term weight, doc_id)], best first
+        self._expansions = {}    # (token, is_last) -> [(term, factor)]
+
+    @classmethod
+    def from_documents(cls, docs, id_field: str = "id") -> "SearchIndex":
+        index = cls()
+        for doc in docs:
+            index.add(doc[id_field], doc)
+        return index
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    # ----- Maintenance -----
+
+    def add(self, doc_id, doc: dict):
+        """Index `doc`, replacing any previous version of it"""
+        self.remove(doc_id)
+        terms = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            tokens = tokenize(_field_text(doc.get(field)))
+            length += weight * len(tokens)
+            for token in tokens:
+                terms[token] = terms.get(token, 0.0) + weight
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                for gram in trigrams(term):
+                    self._trigrams.setdefault(gram, set()).add(term)
+                self._vocabulary_changed()
+            postings[doc_id] = tf
+            self._impacts.pop(term, None)
+
+    def remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            self._impacts.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                for gram in trigrams(term):
+                    grams = self._trigrams.get(gram)
+                    if grams is not None:
+                        grams.discard(term)
+                        if not grams:
+                            del self._trigrams[gram]
+                self._vocabulary_changed()
+
+    def _vocabulary_changed(self):
+        self._sorted_dirty = True
+        self._expansions.clear()
+
+    # ----- Term expansion -----
+
+    def _terms_with_prefix(self, prefix: str, limit: int) -> list:
+        if self._sorted_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._sorted_dirty = False
+        matches = []
+        i = bisect_left(self._sorted_terms, prefix)
+        while i < len(self._sorted_terms) and len(matches) < limit:
+            term = self._sorted_terms[i]
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                matches.append(term)
+            i += 1
+        return matches
+
+    def _fuzzy_terms(self, token: str) -> list:
+        """Vocabulary terms within a small edit distance of `token`"""
+        allowed = max_edits(token)
+        if not allowed:
+            return []
+        overlap = {}
+        for gram in trigrams(token):
+            for term in self._trigrams.get(gram, ()):
+                overlap[term] = overlap.get(term, 0) + 1
+        candidates = heapq.nlargest(50, overlap.items(), key=lambda item: item[1])
+        matches = []
+        for term, _ in candidates:
+            distance = edit_distance(token, term, allowed)
+            if distance <= allowed:
+                matches.append((distance, -len(self._postings[term]), term))
+        matches.sort()
+        return [(term, distance) for distance, _, term in matches[:MAX_FUZZY_EXPANSIONS]]
+
+    def expand(self, query: str) -> list:
+        """(term, factor) pairs a query searches for"""
+        tokens = tokenize(query)
+        expanded = {}
+        for position, token in enumerate(tokens):
+            for term, factor in self._expand_token(token, position == len(tokens) - 1):
+                expanded[term] = max(expanded.get(term, 0.0), factor)
+        return list(expanded.items())
+
+    def _expand_token(self, token: str, is_last: bool) -> list:
+        key = (token, is_last)
+        matches = self._expansions.get(key)
+        if matches is not None:
+            return matches
+        matches = []
+        if token in self._postings:
+            matches.append((token, 1.0))
+        # The last term may still be being typed
+        if is_last and len(token) >= 2:
+            matches.extend((term, PREFIX_FACTOR) for term in self._terms_with_prefix(token, MAX_PREFIX_EXPANSIONS))
+        if not matches:
+            matches.extend((term, FUZZY_FACTORS[distance]) for term, distance in self._fuzzy_terms(token))
+        if len(self._expansions) >= MAX_CACHED_EXPANSIONS:
+            self._expansions.clear()
+        self._expansions[key] = matches
+        return matches
+
+    def _top_postings(self, term: str, average_length: float) -> list:
+        """Best postings of `term` by BM25 term weight, computed once per change to the term"""
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            lengths = self._doc_lengths
+            impacts = heapq.nlargest(MAX_POSTINGS_PER_TERM, (
+                (tf * (K1 + 1) / (tf + K1 * (1 - B + B * lengths[doc_id] / average_length)), doc_id)
+                for doc_id, tf in self._postings[term].items()
+            ))
+            self._impacts[term] = impacts
+        return impacts
+
+    # ----- Queries -----
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Best matching (doc_id, score) pairs, highest score first"""
+        doc_count = len(self._doc_terms)
+        if not doc_count:
+            return []
+        average_length = self._total_length / doc_count or 1.0
+        scores = {}
+        for term, factor in self.expand(query):
+            df = len(self._postings[term])
+            weight = factor * math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for impact, doc_id in self._top_postings(term, average_length):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * impact
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+class ProductSearch:
+    """SearchIndex kept in step with the versioned product cache
+
+    Single product writes are applied incrementally; anything else (imports,
+    reseeds, concurrent writes) leaves the index behind the cache version and
+    it is rebuilt off the event loop on the next query.
+    """
+
+    def __init__(self):
+        self.index = SearchIndex()
+        self.version = None
+        self._lock = asyncio.Lock()
+
+    async def current(self, version: int, load) -> SearchIndex:
+        """Index matching `version`, rebuilt from `load()` when it is stale"""
+        if self.version == version:
+            return self.index
+        async with self._lock:
+            if self.version == version:
+                return self.index
+            docs = await load()
+            self.index = await asyncio.to_thread(SearchIndex.from_documents, docs)
+            self.version = version
+            return self.index
+
+    def apply(self, version: int, doc_id, doc: dict = None):
+        """Apply one write that moved the collection to `version` (doc=None deletes)"""
+        if self.version != version - 1:
+            return
+        if doc is None:
+            self.index.remove(doc_id)
+        else:
+            self.index.add(doc_id, doc)
+        self.version = version
+
+
+# Suggestion kinds in tie-break order
+SUGGESTION_KINDS = ("category", "type", "product")
+
+# Upper bound on phrases examined per prefix, so one-letter prefixes stay cheap
+MAX_SUGGESTION_SCAN = 2000
+
+
+def phrase_key(text: str) -> str:
+    """Lowercased words of `text` joined by single spaces"""
+    return " ".join(TOKEN_RE.findall(str(text or "").lower()))
+
+
+class Suggester:
+    """Prefix typeahead over product names, product types and category names
+
+    Every phrase is stored once per word it contains ("jumbo cashews",
+    "cashews") in a sorted array, so a prefix of any word finds it with one
+    bisect. Popularity counters survive rebuilds because they are keyed by
+    the suggestion rather than by its position.
+    """
+
+    def __init__(self):
+        self.popularity = Counter()
+        self.versions = None
+        # (sorted (key, entry) pairs, entries, phrase → refs), replaced as a whole
+        self._index = ([], [], {})
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def build(products, categories) -> tuple:
+        """Index tuple for `products` and `categories`; safe to run in a worker thread"""
+        suggestions = {}
+        for category in categories:
+            suggestions[("category", category.get("slug"))] = {
+                "text": category.get("name", ""), "kind": "category", "slug": category.get("slug")}
+        for product in products:
+            if product.get("type"):
+                suggestions.setdefault(("type", product["type"]), {"text": product["type"], "kind": "type"})
+            suggestions[("product", product.get("slug"))] = {
+                "text": product.get("name", ""), "kind": "product", "slug": product.get("slug")}
+
+        keys = []
+        entries = []
+        by_phrase = {}
+        for ref, suggestion in suggestions.items():
+            phrase = phrase_key(suggestion["text"])
+            by_phrase.setdefault(phrase, []).append(ref)
+            words = phrase.split(" ")
+            for start in range(len(words)):
+                keys.append((" ".join(words[start:]), len(entries)))
+            entries.append((ref, suggestion))
+        keys.sort()
+        return keys, entries, by_phrase
+
+    async def current(self, versions, load) -> "Suggester":
+        """This suggester brought up to `versions`, rebuilt off the event loop from `load()` when stale
+
+        `load()` returns (products, categories). Concurrent callers share one rebuild.
+        """
+        if self.versions == versions:
+            return self
+        async with self._lock:
+            if self.versions == versions:
+                return self
+            products, categories = await load()
+            self._index = await asyncio.to_thread(self.build, products, categories)
+            self.versions = versions
+            return self
+
+    def record(self, kind: str, ref: str):
+        """Count one use of a suggestion (a product view or a search for it)"""
+        self.popularity[(kind, ref)] += 1
+
+    def record_phrase(self, text: str):
+        """Count a search whose text is exactly a suggestion"""
+        for ref in self._index[2].get(phrase_key(text), ()):
+            self.popularity[ref] += 1
+
+    def suggest(self, prefix: str, limit: int = 8) -> list:
+        prefix = phrase_key(prefix)
+        if not prefix:
+            return []
+        keys, entries, _ = self._index
+        seen = set()
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and len(seen) < MAX_SUGGESTION_SCAN:
+            key, entry = keys[i]
+            if not key.startswith(prefix):
+                break
+            seen.add(entry)
+            i += 1
+        ranked = sorted(
+            (entries[entry] for entry in seen),
+            key=lambda item: (
+                -self.popularity[item[0]],
+                SUGGESTION_KINDS.index(item[1]["kind"]),
+                len(item[1]["text"]),
+                item[1]["text"],
+            ),
+        )
+        return [suggestion for _, suggestion in ranked[:limit]]
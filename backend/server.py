@@ -1,16 +1,38 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Request, Query
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import os
+import re
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Optional, Union
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
+from email.utils import formatdate
 import base64
 
+from catalog_cache import CatalogCache, Snapshot, gzip_etag, not_modified
+from pagination import encode_cursor, decode_cursor, keyset_filter
+from db_indexes import ensure_indexes
+from search_index import ProductSearch, Suggester
+from product_facets import ProductFacets
+from uploads import UPLOAD_TYPES, UploadSizeLimit, is_content_addressed, save_upload
+from image_variants import ImageVariants
+from upload_files import check_filename
+from storage import LocalStorage, S3Storage
+from upload_gc import UploadCollector
+from exports import EXPORT_BATCH_SIZE, EXPORT_FORMATS, export_response, gzip_chunks, stream_theme
+from write_behind import WriteBehindQueue
+from theme_import import ThemeImporter, ndjson_records
+from collection_swap import CollectionSwap, SwapFailed
+from theme_diff import has_changes, plan_collection
+from change_log import ChangeLog
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -25,6 +47,15 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# In-memory storefront snapshot, invalidated by every content write
+catalog = CatalogCache()
+
+# Full-text product search, kept in step with the cached products
+product_search = ProductSearch()
+
+# Typeahead suggestions over product, type and category names
+suggester = Suggester()
+
 # ============== MODELS ==============
 
 # Status Check Models
@@ -91,6 +122,11 @@ class ProductCreate(BaseModel):
     features: List[str] = ["Healthy Heart", "High Nutrition", "Gluten Free", "Cholesterol Free"]
     priceVariants: dict = {}
 
+class ProductPage(BaseModel):
+    items: List[Product]
+    total: int
+    nextCursor: Optional[str] = None
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     slug: Optional[str] = None
@@ -332,6 +368,118 @@ class NewsletterSubscription(BaseModel):
     email: str
     createdAt: str = ""
 
+# ============== CATALOG CACHE ==============
+
+def _list_loader(collection, model, limit):
+    """Build a snapshot loader that validates documents like the list routes do"""
+    async def load():
+        docs = await collection.find({}, {"_id": 0}).to_list(limit)
+        return [model(**doc).model_dump(mode="json") for doc in docs]
+    return load
+
+async def _load_site_settings():
+    settings = await db.site_settings.find_one({"id": "site_settings"}, {"_id": 0})
+    return (SiteSettings(**settings) if settings else SiteSettings()).model_dump(mode="json")
+
+catalog.register("categories", _list_loader(db.categories, Category, 100))
+catalog.register("products", _list_loader(db.products, Product, None))
+catalog.register("heroSlides", _list_loader(db.hero_slides, HeroSlide, 100))
+catalog.register("testimonials", _list_loader(db.testimonials, Testimonial, 100))
+catalog.register("giftBoxes", _list_loader(db.gift_boxes, GiftBox, 100))
+catalog.register("siteSettings", _load_site_settings)
+
+# Store-wide content revision; every content write below records what it changed
+change_log = ChangeLog(db, retention_days=float(os.environ.get("CHANGE_LOG_RETENTION_DAYS", 30)))
+CHANGE_LOG_PRUNE_INTERVAL = 3600
+
+# Replicas poll the revision and drop the cached collections other replicas wrote (0 disables)
+CACHE_SYNC_INTERVAL = float(os.environ.get("CACHE_SYNC_INTERVAL_MS", 1000)) / 1000
+
+def _invalidate_changed(keys):
+    """Drop cached collections written by another replica (all of them when `keys` is None)"""
+    catalog.invalidate(*(keys or ()))
+
+async def _record_reset(keys):
+    """Log that the collections `keys` were replaced wholesale"""
+    for key in keys:
+        await change_log.record(key, "reset")
+
+def _index_by(field):
+    """Builder for a {doc[field]: doc} lookup map"""
+    return lambda docs: {doc.get(field): doc for doc in docs}
+
+def _group_by(field):
+    """Builder for a {doc[field]: [docs]} grouping"""
+    def build(docs):
+        groups = {}
+        for doc in docs:
+            groups.setdefault(doc.get(field), []).append(doc)
+        return groups
+    return build
+
+async def _product_snapshot(field: str, value: str) -> Optional[Snapshot]:
+    """Cached snapshot of the product whose `field` equals `value`, resolved in O(1)"""
+    products = await catalog.derived("products", f"by_{field}", _index_by(field))
+    product = products.get(value)
+    if product is None:
+        return None
+    modified = catalog.last_modified("products")
+    return await catalog.derived("products", f"{field}:{value}", lambda _: Snapshot(product, modified))
+
+# Bodies smaller than this are not worth compressing (matches nginx gzip_min_length)
+GZIP_MIN_SIZE = 1024
+
+# Cache-Control policies per kind of resource
+CACHE_CONTENT = "public, no-cache"          # storefront content: revalidate, 304 while unchanged
+CACHE_PRIVATE = "private, no-cache"         # admin listings: never kept by shared caches
+CACHE_NONE = "no-store"                     # health checks and downloads
+CACHE_UPLOADS = "public, max-age=2592000"   # uploaded files (30 days)
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"  # content-addressed uploads
+CACHE_SHORT = "public, max-age=60"          # typeahead suggestions, pending image variants
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since"""
+    return not_modified(request.headers, etag, last_modified)
+
+def _snapshot_response(request: Request, snapshot: Snapshot, cache_control: str = CACHE_CONTENT,
+                       extra_headers: Optional[dict] = None):
+    """Serve a pre-encoded snapshot with validators, gzipped when the client accepts it
+
+    Conditional requests are answered with 304 before any body is touched.
+    """
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding", **(extra_headers or {})}
+    if snapshot.last_modified is not None:
+        headers["Last-Modified"] = formatdate(snapshot.last_modified, usegmt=True)
+    use_gzip = len(snapshot.body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", "")
+    headers["ETag"] = gzip_etag(snapshot.etag) if use_gzip else snapshot.etag
+
+    if _not_modified(request, snapshot.etag, snapshot.last_modified):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=snapshot.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+def _not_modified_response(request: Request, etag: str, cache_control: str = CACHE_CONTENT):
+    """304 for a validator checked before the body was built, echoing the form the client holds"""
+    if_none_match = request.headers.get("if-none-match", "")
+    headers = {
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+        "ETag": gzip_etag(etag) if '-gzip"' in if_none_match else etag,
+    }
+    return Response(status_code=304, headers=headers)
+
+def _after_cursor(query: dict, order: list, after: Optional[str]) -> dict:
+    """Narrow `query` to the documents after the keyset cursor `after` (400 when malformed)"""
+    if not after:
+        return query
+    try:
+        position = keyset_filter(order, decode_cursor(after, order))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"$and": [query, position]} if query else position
+
 # ============== ROUTES ==============
 
 @api_router.get("/")
@@ -339,8 +487,9 @@ async def root():
     return {"message": "DryFruto API"}
 
 @api_router.get("/health")
-async def health_check():
+async def health_check(response: Response):
     """Health check endpoint for Docker container"""
+    response.headers["Cache-Control"] = CACHE_NONE
     try:
         # Simple database connectivity check
         await db.command("ping")
@@ -359,23 +508,38 @@ async def create_status_check(input: StatusCheckCreate):
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
+async def get_status_checks(request: Request):
     status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
     for check in status_checks:
         if isinstance(check['timestamp'], str):
             check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-    return status_checks
+    checks = [StatusCheck(**check).model_dump(mode="json") for check in status_checks]
+    return _snapshot_response(request, Snapshot(checks), CACHE_PRIVATE)
 
 # ----- Category Routes -----
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories():
-    categories = await db.categories.find({}, {"_id": 0}).to_list(100)
-    return categories
+async def get_categories(request: Request):
+    return _snapshot_response(request, await catalog.snapshot("categories"))
+
+@api_router.get("/categories/{slug}/products", response_model=List[Product])
+async def get_category_products(request: Request, slug: str):
+    categories = await catalog.derived("categories", "by_slug", _index_by("slug"))
+    if slug not in categories:
+        raise HTTPException(status_code=404, detail="Category not found")
+    suggester.record("category", slug)
+    groups = await catalog.derived("products", "by_category", _group_by("category"))
+    modified = catalog.last_modified("products")
+    snapshot = await catalog.derived(
+        "products", f"category:{slug}", lambda _: Snapshot(groups.get(slug, []), modified)
+    )
+    return _snapshot_response(request, snapshot)
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(category: CategoryCreate):
     category_obj = Category(**category.model_dump())
     await db.categories.insert_one(category_obj.model_dump())
+    catalog.invalidate("categories")
+    await change_log.record("categories", "upsert", [category_obj.id])
     return category_obj
 
 @api_router.put("/categories/{category_id}", response_model=Category)
@@ -384,35 +548,149 @@ async def update_category(category_id: str, category: CategoryUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
     result = await db.categories.update_one({"id": category_id}, {"$set": update_data})
+    catalog.invalidate("categories")
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await change_log.record("categories", "upsert", [category_id])
     updated = await db.categories.find_one({"id": category_id}, {"_id": 0})
     return Category(**updated)
 
 @api_router.delete("/categories/{category_id}")
 async def delete_category(category_id: str):
     result = await db.categories.delete_one({"id": category_id})
+    catalog.invalidate("categories")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await change_log.record("categories", "delete", [category_id])
     return {"message": "Category deleted"}
 
 # ----- Product Routes -----
-@api_router.get("/products", response_model=List[Product])
-async def get_products():
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    return products
+PRODUCT_PAGE_SIZE = 24
+
+# Every sort ends with _id so cursors point at a unique position
+PRODUCT_SORTS = {
+    "default": [("_id", 1)],
+    "price-low": [("basePrice", 1), ("_id", 1)],
+    "price-high": [("basePrice", -1), ("_id", -1)],
+    "name": [("name", 1), ("_id", 1)],
+}
+
+def _product_filter(category=None, product_type=None, q=None, min_price=None, max_price=None) -> dict:
+    """Mongo filter for the storefront product filters"""
+    query = {}
+    if category:
+        query["category"] = category
+    if product_type:
+        query["type"] = product_type
+    if q and q.strip():
+        pattern = {"$regex": re.escape(q.strip()), "$options": "i"}
+        query["$or"] = [{"name": pattern}, {"type": pattern}, {"category": pattern}]
+    price = {}
+    if min_price is not None:
+        price["$gte"] = min_price
+    if max_price is not None:
+        price["$lte"] = max_price
+    if price:
+        query["basePrice"] = price
+    return query
+
+@api_router.get("/products", response_model=Union[List[Product], ProductPage])
+async def get_products(
+    request: Request,
+    category: Optional[str] = None,
+    product_type: Optional[str] = Query(None, alias="type"),
+    q: Optional[str] = None,
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    after: Optional[str] = None,
+):
+    """Whole catalog, or one filtered page ({items, total, nextCursor}) when any parameter is given"""
+    params = (category, product_type, q, minPrice, maxPrice, sort, limit, after)
+    if all(param is None for param in params):
+        return _snapshot_response(request, await catalog.snapshot("products"))
+
+    order = PRODUCT_SORTS.get(sort or "default")
+    if order is None:
+        raise HTTPException(status_code=400, detail=f"Invalid sort. Use one of: {', '.join(PRODUCT_SORTS)}")
+
+    query = _product_filter(category, product_type, q, minPrice, maxPrice)
+    page_query = _after_cursor(query, order, after)
+
+    limit = limit or PRODUCT_PAGE_SIZE
+    # A page only changes with the products, so revalidation is answered before querying
+    etag = catalog.validator(
+        "products", category or None, product_type or None, (q or "").strip() or None,
+        minPrice, maxPrice, sort or "default", limit, after,
+    )
+    if _not_modified(request, etag):
+        return _not_modified_response(request, etag)
+
+    docs, total = await asyncio.gather(
+        db.products.find(page_query).sort(order).limit(limit + 1).to_list(limit + 1),
+        db.products.count_documents(query),
+    )
+    next_cursor = encode_cursor(docs[limit - 1], order) if len(docs) > limit else None
+    items = [Product(**doc).model_dump(mode="json") for doc in docs[:limit]]
+    page = {"items": items, "total": total, "nextCursor": next_cursor}
+    return _snapshot_response(request, Snapshot(page, etag=etag))
+
+@api_router.get("/products/facets")
+async def get_product_facets(
+    request: Request,
+    category: Optional[str] = None,
+    product_type: Optional[str] = Query(None, alias="type"),
+    q: Optional[str] = None,
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+):
+    """Category, type and price bucket counts plus the price range for the current product filters"""
+    facets = await catalog.derived("products", "facets", ProductFacets)
+    result = facets.facets(category, product_type, q, minPrice, maxPrice)
+    return _snapshot_response(request, Snapshot(result, catalog.last_modified("products")))
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
+async def get_product(request: Request, product_id: str):
+    snapshot = await _product_snapshot("id", product_id)
+    if snapshot is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+    suggester.record("product", snapshot.data.get("slug"))
+    return _snapshot_response(request, snapshot)
+
+@api_router.get("/products/by-slug/{slug}", response_model=Product)
+async def get_product_by_slug(request: Request, slug: str):
+    snapshot = await _product_snapshot("slug", slug)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    suggester.record("product", slug)
+    return _snapshot_response(request, snapshot)
+
+# Product fields with a unique index
+UNIQUE_PRODUCT_FIELDS = ("slug", "sku")
+
+async def _product_conflict(error: DuplicateKeyError, doc: dict, product_id: str) -> HTTPException:
+    """409 naming the unique field of `doc` that another product already uses"""
+    fields = list((error.details or {}).get("keyValue") or {})
+    if not fields:
+        # Older servers only describe the index in the message
+        for field in UNIQUE_PRODUCT_FIELDS:
+            if field in doc and await db.products.find_one({field: doc[field], "id": {"$ne": product_id}}, {"_id": 1}):
+                fields = [field]
+                break
+    field = fields[0] if fields else "slug or sku"
+    return HTTPException(status_code=409, detail=f"Another product already uses this {field}")
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product: ProductCreate):
     product_obj = Product(**product.model_dump())
-    await db.products.insert_one(product_obj.model_dump())
+    try:
+        await db.products.insert_one(product_obj.model_dump())
+    except DuplicateKeyError as e:
+        raise await _product_conflict(e, product_obj.model_dump(), product_obj.id)
+    catalog.invalidate("products")
+    product_search.apply(catalog.version("products"), product_obj.id, product_obj.model_dump(mode="json"))
+    await change_log.record("products", "upsert", [product_obj.id])
     return product_obj
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -420,29 +698,76 @@ async def update_product(product_id: str, product: ProductUpdate):
     update_data = {k: v for k, v in product.model_dump().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
-    result = await db.products.update_one({"id": product_id}, {"$set": update_data})
+    try:
+        result = await db.products.update_one({"id": product_id}, {"$set": update_data})
+    except DuplicateKeyError as e:
+        raise await _product_conflict(e, update_data, product_id)
+    catalog.invalidate("products")
+    version = catalog.version("products")
     if result.matched_count == 0:
+        product_search.apply(version, product_id)
         raise HTTPException(status_code=404, detail="Product not found")
-    updated = await db.products.find_one({"id": product_id}, {"_id": 0})
-    return Product(**updated)
+    await change_log.record("products", "upsert", [product_id])
+    updated = Product(**await db.products.find_one({"id": product_id}, {"_id": 0}))
+    product_search.apply(version, product_id, updated.model_dump(mode="json"))
+    return updated
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str):
     result = await db.products.delete_one({"id": product_id})
+    catalog.invalidate("products")
+    product_search.apply(catalog.version("products"), product_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await change_log.record("products", "delete", [product_id])
     return {"message": "Product deleted"}
 
+# ----- Search Routes -----
+async def _search_index():
+    """Product search index for the current catalog version"""
+    return await product_search.current(catalog.version("products"), lambda: catalog.get("products"))
+
+@api_router.get("/search")
+async def search_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Ranked, typo-tolerant product search"""
+    index = await _search_index()
+    products = await catalog.derived("products", "by_id", _index_by("id"))
+    items = [products[doc_id] for doc_id, _ in index.search(q, limit) if doc_id in products]
+    suggester.record_phrase(q)
+    return _snapshot_response(request, Snapshot({"query": q, "total": len(items), "items": items}))
+
+async def _suggestions() -> Suggester:
+    """Typeahead index for the current products and categories"""
+    versions = (catalog.version("products"), catalog.version("categories"))
+    return await suggester.current(
+        versions, lambda: asyncio.gather(catalog.get("products"), catalog.get("categories"))
+    )
+
+@api_router.get("/search/suggest")
+async def suggest_search(
+    request: Request,
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+):
+    """Typeahead suggestions ranked by popularity, cheap enough for every keystroke"""
+    index = await _suggestions()
+    return _snapshot_response(request, Snapshot(index.suggest(prefix, limit)), CACHE_SHORT)
+
 # ----- Hero Slide Routes -----
 @api_router.get("/hero-slides", response_model=List[HeroSlide])
-async def get_hero_slides():
-    slides = await db.hero_slides.find({}, {"_id": 0}).to_list(100)
-    return slides
+async def get_hero_slides(request: Request):
+    return _snapshot_response(request, await catalog.snapshot("heroSlides"))
 
 @api_router.post("/hero-slides", response_model=HeroSlide)
 async def create_hero_slide(slide: HeroSlideCreate):
     slide_obj = HeroSlide(**slide.model_dump())
     await db.hero_slides.insert_one(slide_obj.model_dump())
+    catalog.invalidate("heroSlides")
+    await change_log.record("heroSlides", "upsert", [slide_obj.id])
     return slide_obj
 
 @api_router.put("/hero-slides/{slide_id}", response_model=HeroSlide)
@@ -451,28 +776,33 @@ async def update_hero_slide(slide_id: str, slide: HeroSlideUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
     result = await db.hero_slides.update_one({"id": slide_id}, {"$set": update_data})
+    catalog.invalidate("heroSlides")
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Hero slide not found")
+    await change_log.record("heroSlides", "upsert", [slide_id])
     updated = await db.hero_slides.find_one({"id": slide_id}, {"_id": 0})
     return HeroSlide(**updated)
 
 @api_router.delete("/hero-slides/{slide_id}")
 async def delete_hero_slide(slide_id: str):
     result = await db.hero_slides.delete_one({"id": slide_id})
+    catalog.invalidate("heroSlides")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Hero slide not found")
+    await change_log.record("heroSlides", "delete", [slide_id])
     return {"message": "Hero slide deleted"}
 
 # ----- Testimonial Routes -----
 @api_router.get("/testimonials", response_model=List[Testimonial])
-async def get_testimonials():
-    testimonials = await db.testimonials.find({}, {"_id": 0}).to_list(100)
-    return testimonials
+async def get_testimonials(request: Request):
+    return _snapshot_response(request, await catalog.snapshot("testimonials"))
 
 @api_router.post("/testimonials", response_model=Testimonial)
 async def create_testimonial(testimonial: TestimonialCreate):
     testimonial_obj = Testimonial(**testimonial.model_dump())
     await db.testimonials.insert_one(testimonial_obj.model_dump())
+    catalog.invalidate("testimonials")
+    await change_log.record("testimonials", "upsert", [testimonial_obj.id])
     return testimonial_obj
 
 @api_router.put("/testimonials/{testimonial_id}", response_model=Testimonial)
@@ -481,28 +811,33 @@ async def update_testimonial(testimonial_id: str, testimonial: TestimonialUpdate
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
     result = await db.testimonials.update_one({"id": testimonial_id}, {"$set": update_data})
+    catalog.invalidate("testimonials")
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Testimonial not found")
+    await change_log.record("testimonials", "upsert", [testimonial_id])
     updated = await db.testimonials.find_one({"id": testimonial_id}, {"_id": 0})
     return Testimonial(**updated)
 
 @api_router.delete("/testimonials/{testimonial_id}")
 async def delete_testimonial(testimonial_id: str):
     result = await db.testimonials.delete_one({"id": testimonial_id})
+    catalog.invalidate("testimonials")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Testimonial not found")
+    await change_log.record("testimonials", "delete", [testimonial_id])
     return {"message": "Testimonial deleted"}
 
 # ----- Gift Box Routes -----
 @api_router.get("/gift-boxes", response_model=List[GiftBox])
-async def get_gift_boxes():
-    gift_boxes = await db.gift_boxes.find({}, {"_id": 0}).to_list(100)
-    return gift_boxes
+async def get_gift_boxes(request: Request):
+    return _snapshot_response(request, await catalog.snapshot("giftBoxes"))
 
 @api_router.post("/gift-boxes", response_model=GiftBox)
 async def create_gift_box(gift_box: GiftBoxCreate):
     gift_box_obj = GiftBox(**gift_box.model_dump())
     await db.gift_boxes.insert_one(gift_box_obj.model_dump())
+    catalog.invalidate("giftBoxes")
+    await change_log.record("giftBoxes", "upsert", [gift_box_obj.id])
     return gift_box_obj
 
 @api_router.put("/gift-boxes/{gift_box_id}", response_model=GiftBox)
@@ -511,26 +846,27 @@ async def update_gift_box(gift_box_id: str, gift_box: GiftBoxUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
     result = await db.gift_boxes.update_one({"id": gift_box_id}, {"$set": update_data})
+    catalog.invalidate("giftBoxes")
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Gift box not found")
+    await change_log.record("giftBoxes", "upsert", [gift_box_id])
     updated = await db.gift_boxes.find_one({"id": gift_box_id}, {"_id": 0})
     return GiftBox(**updated)
 
 @api_router.delete("/gift-boxes/{gift_box_id}")
 async def delete_gift_box(gift_box_id: str):
     result = await db.gift_boxes.delete_one({"id": gift_box_id})
+    catalog.invalidate("giftBoxes")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Gift box not found")
+    await change_log.record("giftBoxes", "delete", [gift_box_id])
     return {"message": "Gift box deleted"}
 
 # ----- Site Settings Routes -----
 @api_router.get("/site-settings", response_model=SiteSettings)
-async def get_site_settings():
-    settings = await db.site_settings.find_one({"id": "site_settings"}, {"_id": 0})
-    if not settings:
-        # Return default settings
-        return SiteSettings()
-    return SiteSettings(**settings)
+async def get_site_settings(request: Request):
+    # Defaults are filled in by the cache loader when no settings are stored
+    return _snapshot_response(request, await catalog.snapshot("siteSettings"))
 
 @api_router.put("/site-settings", response_model=SiteSettings)
 async def update_site_settings(settings: SiteSettingsUpdate):
@@ -544,12 +880,34 @@ async def update_site_settings(settings: SiteSettingsUpdate):
         {"$set": update_data},
         upsert=True
     )
+    catalog.invalidate("siteSettings")
+    await change_log.record("siteSettings", "upsert", ["site_settings"])
     updated = await db.site_settings.find_one({"id": "site_settings"}, {"_id": 0})
     return SiteSettings(**updated)
 
+# ----- Storefront Bootstrap -----
+@api_router.get("/bootstrap")
+async def get_bootstrap(request: Request):
+    """All storefront data in one response, revalidated with a combined ETag"""
+    return _snapshot_response(request, await catalog.bootstrap())
+
+@api_router.get("/cache/stats")
+async def get_cache_stats(response: Response):
+    """Catalog cache hit/miss counters per collection"""
+    response.headers["Cache-Control"] = CACHE_NONE
+    return catalog.stats()
+
+@api_router.get("/write-behind/stats")
+async def get_write_behind_stats(response: Response):
+    """Counters of the submission write-behind queue"""
+    response.headers["Cache-Control"] = CACHE_NONE
+    if write_behind is None:
+        return {"enabled": False}
+    return {"enabled": True, **write_behind.stats()}
+
 # ----- Seed Data Route -----
 @api_router.post("/seed-data")
-async def seed_data_endpoint():():
+async def seed_data_endpoint():
     """Seed initial data from mock data"""
     # Check if data already exists
     existing_products = await db.products.count_documents({})
@@ -585,6 +943,9 @@ async def seed_data_endpoint():():
         {"$set": site_settings},
         upsert=True
     )
+    catalog.invalidate()
+    await _record_reset(key for key, _ in THEME_COLLECTIONS)
+    await change_log.record("siteSettings", "upsert", ["site_settings"])
     
     return {"message": "Data seeded successfully"}
 
@@ -592,61 +953,185 @@ async def seed_data_endpoint():():
 # ============== FILE UPLOAD ==============
 
 UPLOAD_DIR = ROOT_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
+
+# Matches nginx's client_max_body_size by default
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+
+# Local disk by default; STORAGE_BACKEND=s3 shares uploads between replicas through a bucket
+if os.environ.get("STORAGE_BACKEND", "local") == "s3":
+    storage = S3Storage(
+        bucket=os.environ["S3_BUCKET"],
+        prefix=os.environ.get("S3_PREFIX", "uploads/"),
+        endpoint_url=os.environ.get("S3_ENDPOINT_URL"),
+        region=os.environ.get("S3_REGION"),
+        presign_ttl=int(os.environ.get("S3_PRESIGN_TTL", 3600)),
+    )
+else:
+    # With UPLOAD_ACCEL_PREFIX set, nginx sends the files via X-Accel-Redirect
+    storage = LocalStorage(UPLOAD_DIR, accel_prefix=os.environ.get("UPLOAD_ACCEL_PREFIX"))
+
+# Resized and WebP copies of uploaded images, rendered in a process pool
+image_variants = ImageVariants(storage, max_workers=int(os.environ.get("IMAGE_WORKERS", 2)))
+
+def _forget_upload(filename: str):
+    storage.forget(filename)
+    for key in image_variants.forget(filename):
+        storage.forget(key)
+
+# Deletes uploads no content document refers to any more (interval 0 disables the background sweep)
+UPLOAD_GC_INTERVAL = float(os.environ.get("UPLOAD_GC_INTERVAL", 900))
+upload_collector = UploadCollector(
+    db,
+    storage,
+    revision=change_log.revision,
+    grace_period=float(os.environ.get("UPLOAD_GC_GRACE_PERIOD", 86400)),
+    on_delete=_forget_upload,
+)
 
 @api_router.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     """Upload an image file and return its URL"""
     try:
         # Validate file type
-        allowed_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-        if file.content_type not in allowed_types:
+        file_ext = UPLOAD_TYPES.get(file.content_type)
+        if file_ext is None:
             raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed.")
         
-        # Generate unique filename
-        file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-        unique_filename = f"{uuid.uuid4()}.{file_ext}"
-        
-        # Save file
-        file_path = UPLOAD_DIR / unique_filename
-        content = await file.read()
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # Stream to disk in chunks, named after the content hash
+        filename, _, created = await save_upload(file, storage, file_ext, UPLOAD_MAX_BYTES)
+        if created or not await image_variants.manifest(filename):
+            image_variants.schedule(filename)
         
         # Return the URL path
-        return {"url": f"/api/uploads/{unique_filename}", "filename": unique_filename}
+        return {"url": f"/api/uploads/{filename}", "filename": filename}
     
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/uploads/gc")
+async def collect_orphaned_uploads():
+    """Sweep the next batch of uploads for files no document refers to"""
+    report = await upload_collector.run()
+    return {**report, "totals": upload_collector.totals}
+
 @api_router.get("/uploads/{filename}")
-async def get_uploaded_file(filename: str):
-    """Serve uploaded files"""
-    from starlette.responses import FileResponse
-    
-    file_path = UPLOAD_DIR / filename
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    return FileResponse(file_path)
+async def get_uploaded_file(
+    request: Request,
+    filename: str,
+    w: Optional[int] = Query(None, ge=1, le=4096),
+    fmt: Optional[str] = Query(None, pattern="^(webp|original)$"),
+):
+    """Serve uploaded files, or a resized/WebP variant of an image when `w` or `fmt` is given"""
+    key = check_filename(filename)
+    # Content-addressed names never change content; older uuid names might be overwritten
+    cache_control = CACHE_IMMUTABLE if is_content_addressed(filename) else CACHE_UPLOADS
+    rendered = True
+    if w is not None or fmt is not None:
+        variant_key, rendered = await image_variants.resolve(filename, w, fmt)
+        key = variant_key or key
+        if not rendered:
+            # Serving the original in place of a variant still being rendered
+            cache_control = CACHE_SHORT
+    response = await storage.response(request, key, cache_control)
+    if not rendered:
+        # Uploaded before variants were rendered on upload
+        image_variants.backfill(filename)
+    return response
 
 # ============== FORM SUBMISSIONS ==============
 
+# Optional write-behind queue absorbing submission bursts; off unless WRITE_BEHIND_DIR is set
+WRITE_BEHIND_DIR = os.environ.get("WRITE_BEHIND_DIR")
+write_behind = WriteBehindQueue(
+    db,
+    Path(WRITE_BEHIND_DIR),
+    flush_interval=float(os.environ.get("WRITE_BEHIND_INTERVAL_MS", 200)) / 1000,
+    batch_size=int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 500)),
+    max_pending=int(os.environ.get("WRITE_BEHIND_MAX_PENDING", 10000)),
+) if WRITE_BEHIND_DIR else None
+
+async def insert_submission(collection: str, doc: dict):
+    """Insert a form submission, through the write-behind queue when it is enabled"""
+    if write_behind is not None:
+        await write_behind.submit(collection, doc)
+    else:
+        await db[collection].insert_one(doc)
+
 # Bulk Order Submissions
 @api_router.post("/bulk-orders")
 async def create_bulk_order(submission: BulkOrderSubmission):
     submission_dict = submission.model_dump()
     submission_dict["id"] = str(uuid.uuid4())
     submission_dict["createdAt"] = datetime.now(timezone.utc).isoformat()
-    await db.bulk_orders.insert_one(submission_dict)
+    await insert_submission("bulk_orders", submission_dict)
     return {"message": "Bulk order inquiry submitted successfully", "id": submission_dict["id"]}
 
+BULK_ORDER_PAGE_SIZE = 50
+
+# Newest first; id orders submissions created in the same instant
+BULK_ORDER_SORT = [("createdAt", -1), ("id", -1)]
+
+def _day_start(day: date) -> str:
+    """ISO timestamp of midnight UTC, comparable with the stored createdAt strings"""
+    return datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc).isoformat()
+
+def _bulk_order_filter(status=None, product_type=None, created_from=None, created_to=None) -> dict:
+    """Mongo filter for the admin submission filters; the date range includes both days"""
+    query = {}
+    if status:
+        query["status"] = status
+    if product_type:
+        query["productType"] = product_type
+    created = {}
+    if created_from:
+        created["$gte"] = _day_start(created_from)
+    if created_to:
+        created["$lt"] = _day_start(created_to + timedelta(days=1))
+    if created:
+        query["createdAt"] = created
+    return query
+
 @api_router.get("/bulk-orders")
-async def get_bulk_orders():
-    orders = await db.bulk_orders.find({}, {"_id": 0}).sort("createdAt", -1).to_list(1000)
-    return orders
+async def get_bulk_orders(
+    request: Request,
+    status: Optional[str] = None,
+    productType: Optional[str] = None,
+    createdFrom: Optional[date] = None,
+    createdTo: Optional[date] = None,
+    limit: int = Query(BULK_ORDER_PAGE_SIZE, ge=1, le=200),
+    after: Optional[str] = None,
+):
+    """One page of bulk orders, newest first; X-Total-Count and X-Next-Cursor describe the rest"""
+    query = _bulk_order_filter(status, productType, createdFrom, createdTo)
+    page_query = _after_cursor(query, BULK_ORDER_SORT, after)
+    # The unfiltered total comes from collection metadata instead of a scan
+    count = db.bulk_orders.count_documents(query) if query else db.bulk_orders.estimated_document_count()
+    docs, total = await asyncio.gather(
+        db.bulk_orders.find(page_query, {"_id": 0}).sort(BULK_ORDER_SORT).limit(limit + 1).to_list(limit + 1),
+        count,
+    )
+    headers = {"X-Total-Count": str(total)}
+    if len(docs) > limit:
+        headers["X-Next-Cursor"] = encode_cursor(docs[limit - 1], BULK_ORDER_SORT)
+    return _snapshot_response(request, Snapshot(docs[:limit]), CACHE_PRIVATE, headers)
+
+EXPORT_FORMAT = Query("csv", pattern="^(" + "|".join(EXPORT_FORMATS) + ")$")
+
+@api_router.get("/bulk-orders/export")
+async def export_bulk_orders(
+    format: str = EXPORT_FORMAT,
+    status: Optional[str] = None,
+    productType: Optional[str] = None,
+    createdFrom: Optional[date] = None,
+    createdTo: Optional[date] = None,
+):
+    """Stream every bulk order matching the listing filters as CSV or NDJSON, newest first"""
+    query = _bulk_order_filter(status, productType, createdFrom, createdTo)
+    cursor = db.bulk_orders.find(query, {"_id": 0}).sort(BULK_ORDER_SORT).batch_size(EXPORT_BATCH_SIZE)
+    return export_response(cursor, format, list(BulkOrderSubmission.model_fields), "bulk_orders")
 
 @api_router.put("/bulk-orders/{order_id}")
 async def update_bulk_order_status(order_id: str, status: str):
@@ -659,23 +1144,70 @@ async def delete_bulk_order(order_id: str):
     return {"message": "Deleted"}
 
 # Newsletter Subscriptions
+def normalize_email(email: str) -> str:
+    """Canonical form under which an address is stored and looked up"""
+    return email.strip().lower()
+
+# Stored addresses not in normalize_email() form: upper case or surrounding whitespace
+UNNORMALIZED_EMAIL = {"$regex": r"[A-Z]|^\s|\s$"}
+
+async def normalize_stored_emails(collection) -> int:
+    """Rewrite addresses stored before signups were normalized; returns how many were changed
+
+    A legacy address whose normalized form is already subscribed is a
+    duplicate and is removed. Runs before the unique email index is built,
+    which such duplicates would otherwise keep from being created.
+    """
+    changed = 0
+    async for doc in collection.find({"email": UNNORMALIZED_EMAIL}, {"_id": 1, "email": 1}):
+        email = normalize_email(doc["email"])
+        try:
+            if await collection.find_one({"email": email}, {"_id": 1}) is None:
+                await collection.update_one({"_id": doc["_id"]}, {"$set": {"email": email}})
+                changed += 1
+                continue
+        except DuplicateKeyError:
+            pass
+        await collection.delete_one({"_id": doc["_id"]})
+        changed += 1
+    return changed
+
 @api_router.post("/newsletter")
 async def subscribe_newsletter(subscription: NewsletterSubscription):
-    # Check if email already exists
-    existing = await db.newsletter.find_one({"email": subscription.email})
-    if existing:
-        return {"message": "Email already subscribed", "exists": True}
-    
+    """Subscribe an address in one round trip; the unique email index rules out duplicates"""
+    email = normalize_email(subscription.email)
+    if not email:
+        raise HTTPException(status_code=400, detail="Email is required")
+
     sub_dict = subscription.model_dump()
+    sub_dict["email"] = email
     sub_dict["id"] = str(uuid.uuid4())
     sub_dict["createdAt"] = datetime.now(timezone.utc).isoformat()
-    await db.newsletter.insert_one(sub_dict)
+    if write_behind is not None:
+        # Queued signups cannot see earlier ones; the unique email index drops repeats at flush time
+        await write_behind.submit("newsletter", sub_dict)
+        return {"message": "Successfully subscribed to newsletter", "id": sub_dict["id"]}
+    try:
+        result = await db.newsletter.update_one({"email": email}, {"$setOnInsert": sub_dict}, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent signup for the same address inserted first
+        return {"message": "Email already subscribed", "exists": True}
+    if result.upserted_id is None:
+        return {"message": "Email already subscribed", "exists": True}
     return {"message": "Successfully subscribed to newsletter", "id": sub_dict["id"]}
 
 @api_router.get("/newsletter")
-async def get_newsletter_subscriptions():
+async def get_newsletter_subscriptions(request: Request):
     subs = await db.newsletter.find({}, {"_id": 0}).sort("createdAt", -1).to_list(1000)
-    return subs
+    return _snapshot_response(request, Snapshot(subs), CACHE_PRIVATE)
+
+@api_router.get("/newsletter/export")
+async def export_newsletter_subscriptions(format: str = EXPORT_FORMAT):
+    """Stream every newsletter subscription as CSV or NDJSON, newest first"""
+    cursor = db.newsletter.find({}, {"_id": 0}).sort("createdAt", -1).batch_size(EXPORT_BATCH_SIZE)
+    return export_response(
+        cursor, format, list(NewsletterSubscription.model_fields), "newsletter_subscriptions"
+    )
 
 @api_router.delete("/newsletter/{sub_id}")
 async def delete_newsletter_subscription(sub_id: str):
@@ -684,48 +1216,165 @@ async def delete_newsletter_subscription(sub_id: str):
 
 # ============== THEME EXPORT ==============
 
+# Export key and Mongo collection of each content section of a theme
+THEME_COLLECTIONS = (
+    ("categories", "categories"),
+    ("products", "products"),
+    ("heroSlides", "hero_slides"),
+    ("testimonials", "testimonials"),
+    ("giftBoxes", "gift_boxes"),
+)
+
+THEME_MODELS = {
+    "categories": Category,
+    "products": Product,
+    "heroSlides": HeroSlide,
+    "testimonials": Testimonial,
+    "giftBoxes": GiftBox,
+}
+
+theme_importer = ThemeImporter(
+    db, {key: (name, THEME_MODELS[key]) for key, name in THEME_COLLECTIONS}, SiteSettings
+)
+
+CHANGE_ID_BATCH = 1000
+
+async def _export_theme_changes(since: int) -> dict:
+    """Documents changed and ids deleted after revision `since`, per collection"""
+    revision, changes = await change_log.changes_since(since)
+    names = {**dict(THEME_COLLECTIONS), "siteSettings": "site_settings"}
+    exported = {}
+    for key, change in changes.items():
+        collection = db[names[key]]
+        if change["reset"]:
+            # The whole collection was replaced; send all of it
+            documents = await collection.find({}, {"_id": 0}).to_list(None)
+            exported[key] = {"reset": True, "documents": documents, "deleted": []}
+            continue
+        ids = sorted(change["upserted"])
+        documents = []
+        for start in range(0, len(ids), CHANGE_ID_BATCH):
+            batch = ids[start:start + CHANGE_ID_BATCH]
+            documents += await collection.find({"id": {"$in": batch}}, {"_id": 0}).to_list(None)
+        # Upserted documents that are gone by now were deleted after being logged
+        found = {doc.get("id") for doc in documents}
+        deleted = sorted(change["deleted"] | {doc_id for doc_id in ids if doc_id not in found})
+        exported[key] = {"reset": False, "documents": documents, "deleted": deleted}
+    return {
+        "exportVersion": "1.0",
+        "exportDate": datetime.now(timezone.utc).isoformat(),
+        "since": since,
+        "revision": revision,
+        "changes": exported,
+    }
+
 @api_router.get("/export-theme")
-async def export_theme():
-    """Export all site settings, content, and theme data as JSON"""
-    import json
-    from starlette.responses import Response
-    
-    # Get all collections data
+async def export_theme(
+    response: Response,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    compress: bool = False,
+    since: Optional[int] = Query(None, ge=0),
+):
+    """Export all site settings, content, and theme data, streamed from the collections
+
+    `format=ndjson` writes one document per line; `compress=true` gzips the download.
+    With `since`, only the documents changed or deleted after that revision
+    are returned, along with the revision to pass next time. Every export
+    carries the current `revision`.
+    """
+    if since is not None:
+        response.headers["Cache-Control"] = CACHE_NONE
+        return await _export_theme_changes(since)
+
+    # Read before the documents: a mirror starting from here may see a change twice, never miss one
+    revision = await change_log.revision()
     settings = await db.site_settings.find_one({"id": "site_settings"}, {"_id": 0})
-    categories = await db.categories.find({}, {"_id": 0}).to_list(1000)
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    hero_slides = await db.hero_slides.find({}, {"_id": 0}).to_list(100)
-    testimonials = await db.testimonials.find({}, {"_id": 0}).to_list(100)
-    gift_boxes = await db.gift_boxes.find({}, {"_id": 0}).to_list(100)
-    
-    # Create export object
-    export_data = {
+    header = {
         "exportVersion": "1.0",
         "exportDate": datetime.now(timezone.utc).isoformat(),
         "themeName": settings.get("businessName", "MyTheme") if settings else "MyTheme",
-        "siteSettings": settings or SiteSettings().model_dump(),
-        "categories": categories,
-        "products": products,
-        "heroSlides": hero_slides,
-        "testimonials": testimonials,
-        "giftBoxes": gift_boxes
+        "revision": revision,
     }
-    
-    # Return as downloadable JSON
-    json_str = json.dumps(export_data, indent=2, default=str)
-    
-    return Response(
-        content=json_str,
-        media_type="application/json",
+    sections = [
+        (key, db[name].find({}, {"_id": 0}).batch_size(EXPORT_BATCH_SIZE))
+        for key, name in THEME_COLLECTIONS
+    ]
+    body = stream_theme(header, settings or SiteSettings().model_dump(), sections, format)
+    media_type = "application/json" if format == "json" else EXPORT_FORMATS["ndjson"]
+    filename = f"{header['themeName']}_theme_export.{format}"
+    if compress:
+        body = gzip_chunks(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
         headers={
-            "Content-Disposition": f"attachment; filename={export_data['themeName']}_theme_export.json"
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": CACHE_NONE
         }
     )
 
+async def _import_theme_diff(import_data: dict):
+    """Write only the documents that differ from the stored ones, one bulk_write per collection"""
+    targets = [(key, db[name]) for key, name in THEME_COLLECTIONS if import_data.get(key)]
+    if "siteSettings" in import_data:
+        targets.append(("siteSettings", db.site_settings))
+    # Plan every collection before writing any, so a bad document changes nothing
+    plans = {}
+    try:
+        for key, collection in targets:
+            if key == "siteSettings":
+                settings = {**import_data["siteSettings"], "id": "site_settings"}
+                plans[key] = await plan_collection(collection, [settings], delete_missing=False)
+            else:
+                plans[key] = await plan_collection(collection, import_data[key])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    written = []
+    try:
+        for key, collection in targets:
+            operations, _, ids = plans[key]
+            if operations:
+                written.append(key)
+                await collection.bulk_write(operations, ordered=True)
+                if ids["upserted"]:
+                    await change_log.record(key, "upsert", ids["upserted"])
+                if ids["deleted"]:
+                    await change_log.record(key, "delete", ids["deleted"])
+    except PyMongoError as e:
+        logging.error(f"Import error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if written:
+            catalog.invalidate(*written)
+
+    changes = {key: summary for key, (_, summary, _) in plans.items()}
+    message = "Theme imported successfully" if any(map(has_changes, changes.values())) else "Theme already up to date"
+    return {"message": message, "success": True, "changes": changes}
+
 @api_router.post("/import-theme")
-async def import_theme(import_data: dict):
-    """Import theme data from JSON"""
+async def import_theme(import_data: dict, mode: str = Query("replace", pattern="^(replace|diff)$")):
+    """Import theme data from JSON
+
+    Each collection present in the payload is loaded into a staging
+    collection and swapped in only once all of them are loaded, so the
+    storefront never sees a half-imported catalog. `mode=diff` instead
+    writes only the documents that were added, changed or removed, matched
+    by `id`, and returns a summary of the changes.
+    """
+    if mode == "diff":
+        return await _import_theme_diff(import_data)
     try:
+        async with CollectionSwap(db) as swap:
+            for key, name in THEME_COLLECTIONS:
+                if key in import_data and import_data[key]:
+                    staging = await swap.stage(name)
+                    await staging.insert_many(import_data[key])
+        await _record_reset(key for key, _ in THEME_COLLECTIONS if import_data.get(key))
+        
         # Import site settings
         if "siteSettings" in import_data:
             settings = import_data["siteSettings"]
@@ -735,46 +1384,54 @@ async def import_theme(import_data: dict):
                 settings,
                 upsert=True
             )
-        
-        # Import categories
-        if "categories" in import_data and import_data["categories"]:
-            await db.categories.delete_many({})
-            await db.categories.insert_many(import_data["categories"])
-        
-        # Import products
-        if "products" in import_data and import_data["products"]:
-            await db.products.delete_many({})
-            await db.products.insert_many(import_data["products"])
-        
-        # Import hero slides
-        if "heroSlides" in import_data and import_data["heroSlides"]:
-            await db.hero_slides.delete_many({})
-            await db.hero_slides.insert_many(import_data["heroSlides"])
-        
-        # Import testimonials
-        if "testimonials" in import_data and import_data["testimonials"]:
-            await db.testimonials.delete_many({})
-            await db.testimonials.insert_many(import_data["testimonials"])
-        
-        # Import gift boxes
-        if "giftBoxes" in import_data and import_data["giftBoxes"]:
-            await db.gift_boxes.delete_many({})
-            await db.gift_boxes.insert_many(import_data["giftBoxes"])
+            await change_log.record("siteSettings", "upsert", ["site_settings"])
         
         return {"message": "Theme imported successfully", "success": True}
     except Exception as e:
         logging.error(f"Import error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        catalog.invalidate()
+
+@api_router.post("/import-theme/stream")
+async def import_theme_stream(request: Request):
+    """Import an NDJSON theme export (gzipped or not) while it is uploaded
+
+    Takes the output of export-theme?format=ndjson as the raw request body.
+    """
+    if theme_importer.running:
+        raise HTTPException(status_code=409, detail="An import is already running")
+    try:
+        progress = await theme_importer.run(ndjson_records(request.stream()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SwapFailed as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        catalog.invalidate()
+    await _record_reset(key for key in progress["inserted"] if key != "siteSettings")
+    if "siteSettings" in progress["inserted"]:
+        await change_log.record("siteSettings", "upsert", ["site_settings"])
+    return {"message": "Theme imported successfully", "success": True, **progress}
+
+@api_router.get("/import-theme/progress")
+async def get_import_theme_progress(response: Response):
+    """Progress of the running (or last) streamed theme import"""
+    response.headers["Cache-Control"] = CACHE_NONE
+    return theme_importer.progress or {"state": "idle"}
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(UploadSizeLimit, paths=["/api/upload"], max_bytes=UPLOAD_MAX_BYTES)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
 # Configure logging
@@ -784,6 +1441,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Strong references to fire-and-forget tasks
+background_tasks = set()
+
+def spawn(coro):
+    """Run `coro` in the background, keeping it referenced until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 async def wait_for_mongodb(max_retries=30, delay=2):
     """Wait for MongoDB to be ready"""
     import asyncio
@@ -813,37 +1480,21 @@ async def do_seed_data():
         # Now import seed_data
         from seed_data import categories, products, hero_slides, testimonials, gift_boxes, site_settings
         
-        # Clear existing data
-        await db.categories.delete_many({})
-        await db.products.delete_many({})
-        await db.hero_slides.delete_many({})
-        await db.testimonials.delete_many({})
-        await db.gift_boxes.delete_many({})
-        
-        # Insert categories
-        if categories:
-            await db.categories.insert_many([dict(c) for c in categories])
-            logger.info(f"Seeded {len(categories)} categories")
-        
-        # Insert products
-        if products:
-            await db.products.insert_many([dict(p) for p in products])
-            logger.info(f"Seeded {len(products)} products")
-        
-        # Insert hero slides
-        if hero_slides:
-            await db.hero_slides.insert_many([dict(h) for h in hero_slides])
-            logger.info(f"Seeded {len(hero_slides)} hero slides")
-        
-        # Insert testimonials
-        if testimonials:
-            await db.testimonials.insert_many([dict(t) for t in testimonials])
-            logger.info(f"Seeded {len(testimonials)} testimonials")
-        
-        # Insert gift boxes
-        if gift_boxes:
-            await db.gift_boxes.insert_many([dict(g) for g in gift_boxes])
-            logger.info(f"Seeded {len(gift_boxes)} gift boxes")
+        # Load into staging collections and swap them in together, so the
+        # storefront never reads an empty catalog while reseeding
+        seeds = (
+            ("categories", categories),
+            ("products", products),
+            ("hero_slides", hero_slides),
+            ("testimonials", testimonials),
+            ("gift_boxes", gift_boxes),
+        )
+        async with CollectionSwap(db) as swap:
+            for name, docs in seeds:
+                staging = await swap.stage(name)
+                if docs:
+                    await staging.insert_many([dict(d) for d in docs])
+                    logger.info(f"Seeded {len(docs)} {name.replace('_', ' ')}")
         
         # Insert site settings
         await db.site_settings.update_one(
@@ -852,6 +1503,8 @@ async def do_seed_data():
             upsert=True
         )
         logger.info("Seeded site settings")
+        await _record_reset(key for key, _ in THEME_COLLECTIONS)
+        await change_log.record("siteSettings", "upsert", ["site_settings"])
         
         return {
             "categories": len(categories),
@@ -866,16 +1519,39 @@ async def do_seed_data():
     except Exception as e:
         logger.error(f"Error during seeding: {e}")
         raise
+    finally:
+        catalog.invalidate()
+
+async def _provision_indexes():
+    """Normalize legacy newsletter addresses, then build the registered indexes"""
+    try:
+        changed = await normalize_stored_emails(db.newsletter)
+        if changed:
+            logger.info(f"Normalized {changed} stored newsletter addresses")
+    except PyMongoError as e:
+        logger.error(f"Could not normalize stored newsletter addresses: {e}")
+    await ensure_indexes(db)
 
 @app.on_event("startup")
 async def startup_db_client():
     """Auto-seed database with default data if empty"""
+    # Replay journaled submissions first; flushes retry until MongoDB is reachable
+    if write_behind is not None:
+        await write_behind.start()
     try:
         # Wait for MongoDB to be ready
         if not await wait_for_mongodb():
             logger.error("Cannot auto-seed: MongoDB not available")
             return
         
+        # Build indexes in the background so startup is not held up by large collections
+        spawn(_provision_indexes())
+        if UPLOAD_GC_INTERVAL > 0:
+            spawn(upload_collector.run_forever(UPLOAD_GC_INTERVAL))
+        spawn(change_log.prune_forever(CHANGE_LOG_PRUNE_INTERVAL))
+        if CACHE_SYNC_INTERVAL > 0:
+            spawn(change_log.follow(_invalidate_changed, CACHE_SYNC_INTERVAL))
+        
         # Check if data already exists
         existing_products = await db.products.count_documents({})
         if existing_products > 0:
@@ -896,4 +1572,7 @@ async def startup_db_client():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if write_behind is not None:
+        await write_behind.stop()
+    image_variants.shutdown()
     client.close()
@@ -0,0 +1,275 @@
+"""
+Where uploaded files live.
+
+Both backends implement the same small interface. Objects are addressed by
+keys relative to the upload root: "<digest>.jpg" for uploads and
+"variants/<digest>-300.webp" for derived images.
+
+- LocalStorage keeps files in a directory on local disk (the default) and
+  serves them with UploadFiles.
+- S3Storage keeps them in a bucket on S3 or any S3-compatible store such as
+  MinIO. Files are sent with multipart uploads straight from the temp file.
+  Downloads are redirects to presigned URLs, so backend replicas never
+  proxy the bytes and all share the same media.
+
+Uploads are always staged in a local temp file first: the content hash
+that names the object is only known once every byte has been read.
+"""
+
+import asyncio
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+from starlette.responses import RedirectResponse
+
+from upload_files import UploadFiles
+
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _discard(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class LocalStorage:
+    """Uploads in a directory on the local filesystem"""
+
+    def __init__(self, root: Path, accel_prefix: str = None):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.local_directory = root
+        self.staging_dir = root
+        self.files = UploadFiles(root, accel_prefix=accel_prefix)
+        self._listing = None
+
+    def _store(self, temp_path: str, key: str, overwrite: bool) -> bool:
+        path = self.root / key
+        if not overwrite and path.exists():
+            os.unlink(temp_path)
+            # Restart the orphan grace period of the existing copy
+            os.utime(path)
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, path)
+        return True
+
+    async def store(self, temp_path: str, key: str, overwrite: bool = False) -> bool:
+        """Move the finished file `temp_path` to `key`
+
+        Unless `overwrite` is set, an existing object is kept (its content
+        is identical, the key being its hash) and False is returned.
+        """
+        created = await asyncio.to_thread(self._store, temp_path, key, overwrite)
+        self.files.forget(self.root / key)
+        return created
+
+    async def read_bytes(self, key: str):
+        try:
+            return await asyncio.to_thread((self.root / key).read_bytes)
+        except FileNotFoundError:
+            return None
+
+    def _delete(self, key: str) -> int:
+        path = self.root / key
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return 0
+        return size
+
+    async def delete(self, key: str) -> int:
+        """Remove `key`, returning the bytes freed"""
+        freed = await asyncio.to_thread(self._delete, key)
+        self.forget(key)
+        return freed
+
+    def _list(self, start_after: str, limit: int) -> list:
+        if not start_after or self._listing is None:
+            # A walk from the top takes one sorted listing; later pages are cut from it
+            with os.scandir(self.root) as entries:
+                self._listing = sorted(entry.name for entry in entries if entry.is_file(follow_symlinks=False))
+        start = bisect_right(self._listing, start_after)
+        listing = []
+        for name in self._listing[start:start + limit]:
+            try:
+                st = os.stat(self.root / name)
+            except FileNotFoundError:
+                continue
+            listing.append((name, st.st_size, st.st_mtime))
+        return listing
+
+    async def list(self, start_after: str = "", limit: int = 1000) -> list:
+        """(key, size, mtime) of top-level objects after `start_after`, in key order
+
+        The directory is read when listing starts from the top; files added
+        after that show up on the next walk.
+        """
+        return await asyncio.to_thread(self._list, start_after, limit)
+
+    @asynccontextmanager
+    async def local_copy(self, key: str):
+        yield self.root / key
+
+    async def response(self, request, key: str, cache_control: str):
+        return await self.files.response(request, self.root / key, cache_control)
+
+    def forget(self, key: str):
+        self.files.forget(self.root / key)
+
+
+class S3Storage:
+    """Uploads in an S3 (or S3-compatible) bucket under `prefix`"""
+
+    local_directory = None
+
+    def __init__(self, bucket: str, prefix: str = "", staging_dir: Path = None, endpoint_url: str = None,
+                 region: str = None, presign_ttl: int = 3600, client=None, cache_size: int = 1024,
+                 cache_ttl: float = 60.0):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.staging_dir = staging_dir or Path(tempfile.gettempdir())
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.presign_ttl = presign_ttl
+        self.client = client or boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.transfer = TransferConfig(
+            multipart_threshold=MULTIPART_CHUNK_SIZE, multipart_chunksize=MULTIPART_CHUNK_SIZE, max_concurrency=4
+        )
+        # Small LRU of keys known to exist, so popular images skip the HEAD request
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._existing = OrderedDict()
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def _head(self, key: str):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _store(self, temp_path: str, key: str, overwrite: bool) -> bool:
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        try:
+            if not overwrite and self._head(key) is not None:
+                # Copy onto itself to restart the orphan grace period
+                self.client.copy_object(
+                    Bucket=self.bucket,
+                    Key=self._key(key),
+                    CopySource={"Bucket": self.bucket, "Key": self._key(key)},
+                    MetadataDirective="REPLACE",
+                    ContentType=content_type,
+                )
+                return False
+            self.client.upload_file(
+                temp_path, self.bucket, self._key(key),
+                ExtraArgs={"ContentType": content_type}, Config=self.transfer,
+            )
+            return True
+        finally:
+            _discard(temp_path)
+
+    async def store(self, temp_path: str, key: str, overwrite: bool = False) -> bool:
+        """Upload the finished file `temp_path` as `key` (multipart when large) and remove it"""
+        created = await asyncio.to_thread(self._store, temp_path, key, overwrite)
+        self.forget(key)
+        return created
+
+    def _read_bytes(self, key: str):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    async def read_bytes(self, key: str):
+        return await asyncio.to_thread(self._read_bytes, key)
+
+    def _delete(self, key: str) -> int:
+        head = self._head(key)
+        if head is None:
+            return 0
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return head["ContentLength"]
+
+    async def delete(self, key: str) -> int:
+        freed = await asyncio.to_thread(self._delete, key)
+        self.forget(key)
+        return freed
+
+    async def exists(self, key: str) -> bool:
+        """Whether `key` exists; hits are remembered for `cache_ttl` seconds, misses are not"""
+        now = time.monotonic()
+        expires = self._existing.get(key)
+        if expires is not None and expires > now:
+            self._existing.move_to_end(key)
+            return True
+        if await asyncio.to_thread(self._head, key) is None:
+            self._existing.pop(key, None)
+            return False
+        self._existing[key] = now + self.cache_ttl
+        self._existing.move_to_end(key)
+        while len(self._existing) > self.cache_size:
+            self._existing.popitem(last=False)
+        return True
+
+    def _list(self, start_after: str, limit: int) -> list:
+        params = {"Bucket": self.bucket, "Prefix": self.prefix, "Delimiter": "/", "MaxKeys": limit}
+        if start_after:
+            params["StartAfter"] = self._key(start_after)
+        contents = self.client.list_objects_v2(**params).get("Contents", [])
+        return [
+            (item["Key"][len(self.prefix):], item["Size"], item["LastModified"].timestamp())
+            for item in contents
+        ]
+
+    async def list(self, start_after: str = "", limit: int = 1000) -> list:
+        return await asyncio.to_thread(self._list, start_after, limit)
+
+    @asynccontextmanager
+    async def local_copy(self, key: str):
+        """Download `key` to a temp file for the duration of the block"""
+        fd, path = tempfile.mkstemp(dir=self.staging_dir, prefix=".download-")
+        os.close(fd)
+        try:
+            await asyncio.to_thread(self.client.download_file, self.bucket, self._key(key), path)
+            yield Path(path)
+        finally:
+            await asyncio.to_thread(_discard, path)
+
+    def presigned_url(self, key: str, cache_control: str = None) -> str:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if cache_control:
+            params["ResponseCacheControl"] = cache_control
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.presign_ttl)
+
+    async def response(self, request, key: str, cache_control: str):
+        """Redirect to a presigned URL; the object is served with `cache_control` by the store"""
+        if not await self.exists(key):
+            raise HTTPException(status_code=404, detail="File not found")
+        url = self.presigned_url(key, cache_control)
+        # The redirect itself must not outlive the signature
+        max_age = self.presign_ttl // 2
+        match = re.search(r"max-age=(\d+)", cache_control or "")
+        if match:
+            max_age = min(max_age, int(match.group(1)))
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"public, max-age={max_age}"})
+
+    def forget(self, key: str):
+        self._existing.pop(key, None)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Bulk Order Listing Tests for DryFruto Application
+Checks the admin filters and cursors of the paged bulk-order listing
+"""
+
+import os
+import sys
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The Motor client does not connect until it is used
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "dryfruto_test")
+
+import server
+
+
+def created(*args):
+    """createdAt as bulk orders store it"""
+    return datetime(*args, tzinfo=timezone.utc).isoformat()
+
+
+def in_range(query, created_at):
+    bounds = query["createdAt"]
+    return bounds.get("$gte", "") <= created_at and ("$lt" not in bounds or created_at < bounds["$lt"])
+
+
+def test_bulk_order_filter_fields():
+    assert server._bulk_order_filter() == {}
+    query = server._bulk_order_filter("pending", "Almonds")
+    assert query == {"status": "pending", "productType": "Almonds"}
+
+
+def test_date_range_includes_both_days():
+    query = server._bulk_order_filter(created_from=date(2026, 3, 1), created_to=date(2026, 3, 31))
+    assert in_range(query, created(2026, 3, 1, 0, 0, 0))
+    assert in_range(query, created(2026, 3, 31, 23, 59, 59, 999999))
+    assert not in_range(query, created(2026, 2, 28, 23, 59, 59))
+    assert not in_range(query, created(2026, 4, 1, 0, 0, 0))
+
+    # A single day
+    query = server._bulk_order_filter(created_from=date(2026, 3, 5), created_to=date(2026, 3, 5))
+    assert in_range(query, created(2026, 3, 5, 12, 0, 0))
+    assert not in_range(query, created(2026, 3, 6, 0, 0, 0))
+
+
+def test_bulk_order_cursor_continues_after_the_last_row():
+    order = server.BULK_ORDER_SORT
+    cursor = server.encode_cursor({"createdAt": created(2026, 3, 5, 12, 0, 0), "id": "b"}, order)
+    query = server._after_cursor({"status": "pending"}, order, cursor)
+    assert query["$and"][0] == {"status": "pending"}
+    with pytest.raises(HTTPException) as error:
+        server._after_cursor({}, order, "garbage!")
+    assert error.value.status_code == 400
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Catalog Cache Tests for DryFruto Application
+Checks versioning, invalidation and hit/miss accounting without a database
+"""
+
+import asyncio
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_cache import CatalogCache, etag_matches, gzip_etag
+
+
+def make_cache():
+    """Cache with two collections whose loaders count their calls"""
+    calls = {"products": 0, "categories": 0}
+    data = {"products": [{"id": "p1"}], "categories": [{"id": "c1"}]}
+
+    def loader(key):
+        async def load():
+            calls[key] += 1
+            return list(data[key])
+        return load
+
+    cache = CatalogCache()
+    cache.register("products", loader("products"))
+    cache.register("categories", loader("categories"))
+    return cache, calls, data
+
+
+def test_reads_are_served_from_memory():
+    cache, calls, _ = make_cache()
+
+    async def run():
+        for _ in range(5):
+            await cache.get("products")
+
+    asyncio.run(run())
+    assert calls["products"] == 1
+    assert cache.stats()["products"]["hits"] == 4
+    assert cache.stats()["products"]["misses"] == 1
+
+
+def test_invalidate_only_reloads_that_collection():
+    cache, calls, data = make_cache()
+
+    async def run():
+        await cache.get("products")
+        await cache.get("categories")
+        data["products"].append({"id": "p2"})
+        cache.invalidate("products")
+        products = await cache.get("products")
+        await cache.get("categories")
+        return products
+
+    products = asyncio.run(run())
+    assert [p["id"] for p in products] == ["p1", "p2"]
+    assert calls == {"products": 2, "categories": 1}
+    assert cache.version("products") == 1
+    assert cache.version("categories") == 0
+
+
+def test_bootstrap_etag_changes_with_content():
+    cache, _, data = make_cache()
+
+    async def run():
+        first = await cache.bootstrap()
+        again = await cache.bootstrap()
+        data["categories"].append({"id": "c2"})
+        cache.invalidate()
+        second = await cache.bootstrap()
+        return first, again, second
+
+    first, again, second = asyncio.run(run())
+    assert first is again
+    assert first.etag != second.etag
+    assert len(second.data["categories"]) == 2
+
+
+def test_etag_matches_uses_weak_comparison():
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_gzip_etag_revalidates_identity_body():
+    assert gzip_etag('"abc"') == '"abc-gzip"'
+    assert etag_matches(gzip_etag('"abc"'), '"abc"')
+    assert etag_matches('W/"abc-gzip"', '"abc"')
+
+
+def test_snapshot_is_encoded_once_per_version():
+    cache, _, data = make_cache()
+
+    async def run():
+        first = await cache.snapshot("products")
+        again = await cache.snapshot("products")
+        data["products"].append({"id": "p2"})
+        cache.invalidate("products")
+        second = await cache.snapshot("products")
+        return first, again, second
+
+    first, again, second = asyncio.run(run())
+    assert first is again
+    assert first.body == b'[{"id":"p1"}]'
+    assert gzip.decompress(second.gzip_body) == second.body
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Change Log Tests for DryFruto Application
+Checks revision numbering, how logged changes are folded per document and how
+other processes follow them
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from change_log import ChangeLog, RevisionExpired
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCounters:
+    def __init__(self):
+        self.doc = None
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        self.doc = self.doc or {"_id": query["_id"]}
+        self.doc["value"] = self.doc.get("value", 0) + update["$inc"]["value"]
+        return dict(self.doc)
+
+    async def find_one(self, query):
+        return dict(self.doc) if self.doc else None
+
+
+class FakeEntries:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+    def find(self, query, projection=None):
+        since = query["rev"]["$gt"]
+        return FakeCursor([dict(doc) for doc in self.docs if doc["rev"] > since])
+
+
+class FakeDb:
+    def __init__(self):
+        self.counters = FakeCounters()
+        self.change_log = FakeEntries()
+
+
+def test_changes_are_folded_to_the_last_operation_per_document():
+    async def scenario():
+        log = ChangeLog(FakeDb())
+        await log.record("products", "upsert", ["a", "b"])
+        start = await log.revision()
+        await log.record("products", "delete", ["a"])
+        await log.record("products", "upsert", ["c"])
+        await log.record("products", "delete", ["c"])
+        await log.record("categories", "upsert", ["x"])
+        await log.record("heroSlides", "upsert", ["s"])
+        await log.record("heroSlides", "reset")
+        return start, await log.changes_since(start)
+
+    start, (revision, changes) = asyncio.run(scenario())
+    assert start == 1
+    assert revision == 7
+    assert changes["products"] == {"reset": False, "upserted": set(), "deleted": {"a", "c"}}
+    assert changes["categories"]["upserted"] == {"x"}
+    assert changes["heroSlides"] == {"reset": True, "upserted": set(), "deleted": set()}
+
+
+def test_walk_stops_at_a_recent_gap():
+    db = FakeDb()
+    log = ChangeLog(db)
+    now = datetime.now(timezone.utc)
+    db.counters.doc = {"_id": "content_revision", "value": 3}
+    db.change_log.docs = [
+        {"rev": 1, "key": "products", "op": "upsert", "ids": ["a"], "at": now},
+        {"rev": 3, "key": "products", "op": "upsert", "ids": ["c"], "at": now},
+    ]
+    revision, changes = asyncio.run(log.changes_since(0))
+    assert revision == 1
+    assert changes["products"]["upserted"] == {"a"}
+
+    # A gap left long ago is a writer that never logged; skip it
+    db.change_log.docs[1]["at"] = now - timedelta(minutes=5)
+    revision, changes = asyncio.run(log.changes_since(0))
+    assert revision == 3
+    assert changes["products"]["upserted"] == {"a", "c"}
+
+
+def test_pruned_revisions_are_refused():
+    db = FakeDb()
+    db.counters.doc = {"_id": "content_revision", "value": 10, "floor": 5}
+    with pytest.raises(RevisionExpired):
+        asyncio.run(ChangeLog(db).changes_since(4))
+    assert asyncio.run(ChangeLog(db).changes_since(5)) == (5, {})
+
+
+def test_follow_reports_writes_of_other_processes():
+    async def scenario():
+        db = FakeDb()
+        here, other = ChangeLog(db), ChangeLog(db)
+        heard = []
+        task = asyncio.create_task(here.follow(heard.append, 0.01))
+        await asyncio.sleep(0.03)
+        await here.record("products", "upsert", ["a"])
+        await other.record("categories", "upsert", ["x"])
+        await other.record("siteSettings", "upsert", ["site_settings"])
+        await asyncio.sleep(0.03)
+        db.counters.doc["floor"] = 10
+        db.counters.doc["value"] = 12
+        await asyncio.sleep(0.03)
+        task.cancel()
+        return heard
+
+    # Own writes are skipped; pruned entries mean anything may have changed
+    assert asyncio.run(scenario()) == [{"categories", "siteSettings"}, None]
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Collection Swap Tests for DryFruto Application
+Checks that staged collections replace live ones only on success
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collection_swap import CollectionSwap, SwapFailed
+
+
+class FakeCollection:
+    def __init__(self, db, name, docs=None):
+        self.db = db
+        self.name = name
+        self.docs = list(docs or [])
+        self.indexes = 0
+        self.fail_indexes = False
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+    async def create_indexes(self, models):
+        if self.fail_indexes:
+            from pymongo.errors import OperationFailure
+            raise OperationFailure("E11000 duplicate key")
+        self.indexes += len(models)
+
+    async def drop(self):
+        self.db.pop(self.name, None)
+
+    async def rename(self, name, dropTarget=False):
+        assert dropTarget
+        self.db[name] = self.db.pop(self.name)
+        self.name = name
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection(self, name)
+        return self[name]
+
+    async def create_collection(self, name):
+        return self[name]
+
+
+def _live(db):
+    db["products"] = FakeCollection(db, "products", [{"id": "old"}])
+    db["products__staging"] = FakeCollection(db, "products__staging", [{"id": "leftover"}])
+    return db
+
+
+def test_staged_collection_replaces_live_one_with_its_indexes():
+    db = _live(FakeDb())
+
+    async def scenario():
+        async with CollectionSwap(db) as swap:
+            staging = await swap.stage("products")
+            await staging.insert_many([{"id": "new"}])
+            assert db["products"].docs == [{"id": "old"}]
+
+    asyncio.run(scenario())
+    assert db["products"].docs == [{"id": "new"}]
+    assert db["products"].indexes > 0
+    assert "products__staging" not in db
+
+
+def test_failure_drops_staging_and_keeps_live_data():
+    db = _live(FakeDb())
+
+    async def scenario():
+        async with CollectionSwap(db) as swap:
+            await (await swap.stage("products")).insert_many([{"id": "new"}])
+            raise RuntimeError("import failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+    assert db["products"].docs == [{"id": "old"}]
+    assert "products__staging" not in db
+
+
+def test_index_build_failure_aborts_the_swap():
+    db = _live(FakeDb())
+
+    async def scenario():
+        async with CollectionSwap(db) as swap:
+            staging = await swap.stage("products")
+            staging.fail_indexes = True
+            await staging.insert_many([{"id": "dup"}, {"id": "dup"}])
+
+    with pytest.raises(SwapFailed):
+        asyncio.run(scenario())
+    assert db["products"].docs == [{"id": "old"}]
+    assert "products__staging" not in db
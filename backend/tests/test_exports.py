@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Export Streaming Tests for DryFruto Application
+Checks the CSV and NDJSON encoding of streamed submission exports
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exports
+from exports import export_response, gzip_chunks, stream_csv, stream_ndjson, stream_theme
+
+
+class FakeCursor:
+    """Async iterator standing in for a Motor cursor"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+    async def close(self):
+        self.closed = True
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_csv_quotes_values_and_flattens_nested_fields():
+    cursor = FakeCursor([
+        {"id": "1", "name": 'Acme, "Nuts"', "tags": ["a", "b"]},
+        {"id": "2", "name": None},
+    ])
+    chunks = asyncio.run(_collect(stream_csv(cursor, ["id", "name", "tags"])))
+    assert chunks[0] == b"id,name,tags\r\n"
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    assert rows == [["id", "name", "tags"], ["1", 'Acme, "Nuts"', '["a", "b"]'], ["2", "", ""]]
+    assert cursor.closed
+
+
+def test_ndjson_writes_one_document_per_line():
+    docs = [{"id": str(i), "email": f"user{i}@example.com"} for i in range(3)]
+    body = b"".join(asyncio.run(_collect(stream_ndjson(FakeCursor(docs)))))
+    assert [json.loads(line) for line in body.decode("utf-8").splitlines()] == docs
+
+
+def test_rows_are_flushed_in_bounded_chunks(monkeypatch):
+    monkeypatch.setattr(exports, "FLUSH_BYTES", 100)
+    docs = [{"id": str(i), "name": "x" * 40} for i in range(50)]
+    chunks = asyncio.run(_collect(stream_ndjson(FakeCursor(docs))))
+    assert len(chunks) > 10
+    assert all(len(chunk) < 200 for chunk in chunks)
+
+
+def test_export_response_is_an_attachment():
+    response = export_response(FakeCursor([]), "ndjson", ["id"], "newsletter_subscriptions")
+    assert response.media_type == "application/x-ndjson"
+    assert response.headers["content-disposition"].startswith('attachment; filename="newsletter_subscriptions_')
+    assert response.headers["cache-control"] == "private, no-store"
+
+
+def test_theme_json_export_is_one_document():
+    sections = [("categories", FakeCursor([{"id": "c1"}, {"id": "c2"}])), ("products", FakeCursor([]))]
+    stream = stream_theme({"exportVersion": "1.0", "themeName": "Shop"}, {"id": "site_settings"}, sections)
+    assert json.loads(b"".join(asyncio.run(_collect(stream)))) == {
+        "exportVersion": "1.0",
+        "themeName": "Shop",
+        "siteSettings": {"id": "site_settings"},
+        "categories": [{"id": "c1"}, {"id": "c2"}],
+        "products": [],
+    }
+
+
+def test_theme_ndjson_export_tags_each_document_with_its_collection():
+    sections = [("products", FakeCursor([{"id": "p1"}]))]
+    stream = stream_theme({"exportVersion": "1.0"}, {"id": "site_settings"}, sections, "ndjson")
+    lines = [json.loads(line) for line in b"".join(asyncio.run(_collect(stream))).splitlines()]
+    assert lines == [
+        {"exportVersion": "1.0"},
+        {"collection": "siteSettings", "document": {"id": "site_settings"}},
+        {"collection": "products", "document": {"id": "p1"}},
+    ]
+
+
+def test_gzip_chunks_compresses_the_stream():
+    async def chunks():
+        for _ in range(100):
+            yield b"dry fruits " * 100
+
+    compressed = b"".join(asyncio.run(_collect(gzip_chunks(chunks()))))
+    assert gzip.decompress(compressed) == b"dry fruits " * 10000
+    assert len(compressed) < 1000
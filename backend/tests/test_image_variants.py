@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Image Variant Tests for DryFruto Application
+Checks rendering of resized/WebP derivatives and variant selection
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_variants import ImageVariants, pick_variant, render_variants
+from storage import LocalStorage
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def test_render_variants_never_upscales(tmp_path):
+    source = tmp_path / "photo.jpg"
+    Image.new("RGB", (700, 350), (120, 80, 40)).save(source, "JPEG")
+    manifest = render_variants(str(source), str(tmp_path))
+
+    assert manifest["width"] == 700 and manifest["format"] == "jpg"
+    widths = sorted({v["width"] for v in manifest["variants"]})
+    assert widths == [100, 300, 600, 700]
+    for variant in manifest["variants"]:
+        with Image.open(tmp_path / variant["file"]) as image:
+            assert image.width == variant["width"]
+            assert image.format == ("WEBP" if variant["format"] == "webp" else "JPEG")
+    assert (tmp_path / "photo.jpg.json").exists()
+
+
+def test_render_variants_skips_gifs(tmp_path):
+    source = tmp_path / "anim.gif"
+    Image.new("P", (500, 500)).save(source, "GIF")
+    assert render_variants(str(source), str(tmp_path))["variants"] == []
+
+
+def test_pick_variant():
+    manifest = {
+        "format": "jpg",
+        "width": 700,
+        "variants": [
+            {"width": 100, "format": "jpg", "file": "a-100.jpg"},
+            {"width": 100, "format": "webp", "file": "a-100.webp"},
+            {"width": 300, "format": "webp", "file": "a-300.webp"},
+            {"width": 700, "format": "webp", "file": "a.webp"},
+        ],
+    }
+    assert pick_variant(manifest, 250, "webp") == "a-300.webp"
+    assert pick_variant(manifest, 5000, "webp") == "a.webp"
+    assert pick_variant(manifest, None, "webp") == "a.webp"
+    assert pick_variant(manifest, 80) == "a-100.jpg"
+    # No original-format rendering that wide: serve the original
+    assert pick_variant(manifest, 250) is None
+    assert pick_variant({}, 300, "webp") is None
+
+
+def test_pick_variant_without_width_wants_full_size():
+    jpeg = {
+        "format": "jpg",
+        "width": 2000,
+        "variants": [
+            {"width": 1200, "format": "jpg", "file": "x-1200.jpg"},
+            {"width": 1200, "format": "webp", "file": "x-1200.webp"},
+            {"width": 2000, "format": "webp", "file": "x.webp"},
+        ],
+    }
+    assert pick_variant(jpeg, None, "original") is None
+    assert pick_variant(jpeg, None, "webp") == "x.webp"
+    # A WebP upload has no full-size WebP rendering: the original is it
+    webp = {"format": "webp", "width": 2000, "variants": [{"width": 1200, "format": "webp", "file": "y-1200.webp"}]}
+    assert pick_variant(webp, None, "webp") is None
+
+
+def test_uploads_without_manifest_are_backfilled_once(tmp_path):
+    Image.new("RGB", (700, 350), (120, 80, 40)).save(tmp_path / "old.jpg", "JPEG")
+    storage = LocalStorage(tmp_path)
+    variants = ImageVariants(storage, max_workers=1)
+    reads = []
+    read_bytes = storage.read_bytes
+
+    async def counting_read(key):
+        reads.append(key)
+        return await read_bytes(key)
+
+    storage.read_bytes = counting_read
+
+    async def scenario():
+        try:
+            assert await variants.resolve("old.jpg", 300, "webp") == (None, False)
+            assert await variants.resolve("old.jpg", 300, "webp") == (None, False)
+            # The missing manifest is remembered instead of read again
+            assert len(reads) == 1
+            render = variants.backfill("old.jpg")
+            assert variants.backfill("old.jpg") is None
+            # A render requested meanwhile (an upload of the same bytes) joins the running one
+            assert variants.schedule("old.jpg") is render
+            await render
+            return await variants.resolve("old.jpg", 300, "webp")
+        finally:
+            variants.shutdown()
+
+    assert asyncio.run(scenario()) == ("variants/old-300.webp", True)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Newsletter Tests for DryFruto Application
+Checks address normalization, legacy clean-up and the duplicate signup paths
+"""
+
+import asyncio
+import os
+import re
+import sys
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The Motor client does not connect until it is used
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "dryfruto_test")
+
+import server
+
+
+def _matches(doc, query):
+    for field, wanted in query.items():
+        if isinstance(wanted, dict):
+            if not re.search(wanted["$regex"], doc.get(field, "")):
+                return False
+        elif doc.get(field) != wanted:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeNewsletter:
+    """Newsletter collection with an optional unique email index"""
+
+    def __init__(self, docs=(), unique=True):
+        self.docs = [dict(doc, _id=i) for i, doc in enumerate(docs)]
+        self.unique = unique
+        self.race = None
+
+    def _check_unique(self, email, skip=None):
+        if self.unique and any(doc is not skip and doc["email"] == email for doc in self.docs):
+            raise DuplicateKeyError("E11000 duplicate key error index: email_1")
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(doc) for doc in self.docs if _matches(doc, query)])
+
+    async def find_one(self, query, projection=None):
+        return next((dict(doc) for doc in self.docs if _matches(doc, query)), None)
+
+    async def update_one(self, query, update, upsert=False):
+        if self.race is not None:
+            # Another upsert for the same address inserted between this one's lookup and insert
+            self.docs.append(self.race)
+            self.race = None
+            raise DuplicateKeyError("E11000 duplicate key error index: email_1")
+        for doc in self.docs:
+            if _matches(doc, query):
+                if "$set" in update:
+                    self._check_unique(update["$set"]["email"], skip=doc)
+                    doc.update(update["$set"])
+                return type("Result", (), {"upserted_id": None})()
+        doc = dict(update["$setOnInsert"], _id=len(self.docs))
+        self._check_unique(doc["email"])
+        self.docs.append(doc)
+        return type("Result", (), {"upserted_id": doc["_id"]})()
+
+    async def delete_one(self, query):
+        self.docs = [doc for doc in self.docs if not _matches(doc, query)]
+
+
+class FakeDb:
+    def __init__(self, newsletter):
+        self.newsletter = newsletter
+
+
+def test_legacy_addresses_are_normalized_and_deduplicated():
+    # Stored before signups were normalized, so no unique index could be built yet
+    newsletter = FakeNewsletter([
+        {"email": "foo@x.com"},
+        {"email": "Foo@X.com "},
+        {"email": " Bar@Y.com"},
+        {"email": "BAR@y.com"},
+    ], unique=False)
+    assert asyncio.run(server.normalize_stored_emails(newsletter)) == 3
+    assert sorted(doc["email"] for doc in newsletter.docs) == ["bar@y.com", "foo@x.com"]
+    assert asyncio.run(server.normalize_stored_emails(newsletter)) == 0
+
+
+@pytest.fixture
+def newsletter(monkeypatch):
+    collection = FakeNewsletter()
+    monkeypatch.setattr(server, "db", FakeDb(collection))
+    monkeypatch.setattr(server, "write_behind", None)
+    return collection
+
+
+def subscribe(email):
+    return asyncio.run(server.subscribe_newsletter(server.NewsletterSubscription(email=email)))
+
+
+def test_signups_are_stored_normalized_once(newsletter):
+    assert "id" in subscribe("  New@Example.com ")
+    assert subscribe("new@example.COM")["exists"] is True
+    assert [doc["email"] for doc in newsletter.docs] == ["new@example.com"]
+
+
+def test_concurrent_duplicate_signup_reports_existing(newsletter):
+    newsletter.race = {"email": "race@example.com", "_id": "other"}
+    assert subscribe("Race@example.com")["exists"] is True
+    assert len(newsletter.docs) == 1
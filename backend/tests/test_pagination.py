@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Keyset Pagination Tests for DryFruto Application
+Checks cursor round-trips and the generated Mongo range conditions
+"""
+
+import os
+import sys
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pagination import encode_cursor, decode_cursor, keyset_filter
+
+
+def test_cursor_round_trip_keeps_object_ids():
+    sort = [("basePrice", 1), ("_id", 1)]
+    oid = ObjectId()
+    cursor = encode_cursor({"basePrice": 145.0, "_id": oid, "name": "ignored"}, sort)
+    assert decode_cursor(cursor, sort) == [145.0, oid]
+
+
+def test_malformed_cursor_is_rejected():
+    sort = [("basePrice", 1), ("_id", 1)]
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", sort)
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor({"_id": "x"}, [("_id", 1)]), sort)
+
+
+def test_keyset_filter_follows_sort_direction():
+    assert keyset_filter([("createdAt", -1), ("id", -1)], ["2024-01-01", "abc"]) == {
+        "$or": [
+            {"createdAt": {"$lt": "2024-01-01"}},
+            {"createdAt": "2024-01-01", "id": {"$lt": "abc"}},
+        ]
+    }
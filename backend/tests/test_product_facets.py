@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Product Facet Tests for DryFruto Application
+Checks the disjunctive facet counts computed over the cached catalog
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_facets import ProductFacets
+
+PRODUCTS = [
+    {"name": "California Almonds", "type": "Almonds", "category": "nuts", "basePrice": 120},
+    {"name": "Salted Cashews", "type": "Cashews", "category": "nuts", "basePrice": 300},
+    {"name": "Roasted Almonds", "type": "Almonds", "category": "nuts", "basePrice": 2500},
+    {"name": "Pumpkin Seeds", "type": "Pumpkin Seeds", "category": "seeds", "basePrice": 90},
+]
+
+
+def counts(entries):
+    return {entry["value"]: entry["count"] for entry in entries}
+
+
+def test_unfiltered_facets_cover_whole_catalog():
+    result = ProductFacets(PRODUCTS).facets()
+    assert result["total"] == 4
+    assert counts(result["categories"]) == {"nuts": 3, "seeds": 1}
+    assert counts(result["types"]) == {"Almonds": 2, "Cashews": 1, "Pumpkin Seeds": 1}
+    assert [bucket["count"] for bucket in result["priceBuckets"]] == [2, 1, 0, 0, 1]
+    assert result["priceBuckets"][-1]["max"] is None
+    assert result["price"] == {"min": 90.0, "max": 2500.0}
+
+
+def test_facet_ignores_its_own_filter():
+    result = ProductFacets(PRODUCTS).facets(category="nuts", max_price=500)
+    assert result["total"] == 2
+    # Category counts keep the price filter but not the category one
+    assert counts(result["categories"]) == {"nuts": 2, "seeds": 1}
+    assert counts(result["types"]) == {"Almonds": 1, "Cashews": 1}
+    # Price facets keep the category filter but not the price one
+    assert [bucket["count"] for bucket in result["priceBuckets"]] == [1, 1, 0, 0, 1]
+    assert result["price"] == {"min": 120.0, "max": 2500.0}
+
+
+def test_text_and_unknown_values():
+    facets = ProductFacets(PRODUCTS)
+    assert facets.facets(q="ALMOND")["total"] == 2
+    assert facets.facets(product_type="Walnuts")["total"] == 0
+    empty = ProductFacets([]).facets(q="almond")
+    assert empty["total"] == 0
+    assert empty["price"] == {"min": None, "max": None}
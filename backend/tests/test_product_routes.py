@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Product Route Tests for DryFruto Application
+Checks the product query builders, the slug lookups and the write handlers
+against in-memory data
+"""
+
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The Motor client does not connect until it is used
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "dryfruto_test")
+
+import server
+from catalog_cache import CatalogCache
+from search_index import Suggester
+
+
+def _matches(doc, query):
+    for field, wanted in query.items():
+        if isinstance(wanted, dict):
+            if "$ne" in wanted and doc.get(field) == wanted["$ne"]:
+                return False
+        elif doc.get(field) != wanted:
+            return False
+    return True
+
+
+class FakeProducts:
+    """Products collection enforcing the unique slug and sku indexes"""
+
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+        self.queries = 0
+
+    def _check_unique(self, doc, skip=None):
+        for field in server.UNIQUE_PRODUCT_FIELDS:
+            if any(other is not skip and other.get(field) == doc.get(field) for other in self.docs):
+                raise DuplicateKeyError(f"E11000 duplicate key error index: {field}_1")
+
+    async def insert_one(self, doc):
+        self._check_unique(doc)
+        self.docs.append(dict(doc))
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if _matches(doc, query):
+                self._check_unique({**doc, **update["$set"]}, skip=doc)
+                doc.update(update["$set"])
+                return type("Result", (), {"matched_count": 1})()
+        return type("Result", (), {"matched_count": 0})()
+
+    async def find_one(self, query, projection=None):
+        return next((dict(doc) for doc in self.docs if _matches(doc, query)), None)
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        return FakeCursor([dict(doc) for doc in self.docs if _matches(doc, query)])
+
+    async def count_documents(self, query):
+        return sum(1 for doc in self.docs if _matches(doc, query))
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, order):
+        return self
+
+    def limit(self, limit):
+        self.docs = self.docs[:limit]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeDb:
+    def __init__(self, products=()):
+        self.products = FakeProducts(products)
+
+
+PRODUCT = {
+    "name": "Almonds", "slug": "almonds", "category": "nuts", "type": "Almonds", "basePrice": 10,
+    "image": "/a.jpg", "sku": "ALM-1", "shortDescription": "", "description": "",
+}
+
+
+def test_duplicate_slug_or_sku_is_a_conflict(monkeypatch):
+    monkeypatch.setattr(server, "db", FakeDb([{**PRODUCT, "id": "1"}]))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.create_product(server.ProductCreate(**{**PRODUCT, "sku": "ALM-2"})))
+    assert error.value.status_code == 409
+    assert "slug" in error.value.detail
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.create_product(server.ProductCreate(**{**PRODUCT, "slug": "almonds-2"})))
+    assert error.value.status_code == 409
+    assert "sku" in error.value.detail
+
+
+def test_update_to_a_taken_slug_is_a_conflict(monkeypatch):
+    monkeypatch.setattr(server, "db", FakeDb([
+        {**PRODUCT, "id": "1"},
+        {**PRODUCT, "id": "2", "slug": "cashews", "sku": "CSH-1"},
+    ]))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.update_product("2", server.ProductUpdate(slug="almonds")))
+    assert error.value.status_code == 409
+    assert "slug" in error.value.detail
+
+
+def test_product_filter_combines_the_storefront_filters():
+    assert server._product_filter() == {}
+    query = server._product_filter("nuts", "Almonds", " a.b ", 5, 20)
+    assert query["category"] == "nuts" and query["type"] == "Almonds"
+    assert query["basePrice"] == {"$gte": 5, "$lte": 20}
+    # The search text is matched literally, not as a regular expression
+    assert query["$or"][0] == {"name": {"$regex": r"a\.b", "$options": "i"}}
+    assert server._product_filter(q="   ", min_price=0) == {"basePrice": {"$gte": 0}}
+
+
+def test_after_cursor_narrows_the_query():
+    order = server.PRODUCT_SORTS["price-low"]
+    cursor = server.encode_cursor({"basePrice": 10, "_id": "abc"}, order)
+    query = server._after_cursor({"category": "nuts"}, order, cursor)
+    assert query["$and"][0] == {"category": "nuts"}
+    assert server._after_cursor({}, order, cursor) == query["$and"][1]
+    assert server._after_cursor({"category": "nuts"}, order, None) == {"category": "nuts"}
+
+
+def test_malformed_cursor_is_a_bad_request():
+    order = server.PRODUCT_SORTS["name"]
+    # Garbage, and a cursor of the single-field default order
+    for cursor in ["not-a-cursor!", server.encode_cursor({"_id": "x"}, server.PRODUCT_SORTS["default"])]:
+        with pytest.raises(HTTPException) as error:
+            server._after_cursor({}, order, cursor)
+        assert error.value.status_code == 400
+
+
+def _cached_catalog(monkeypatch, categories, products):
+    catalog = CatalogCache()
+
+    async def load_categories():
+        return categories
+
+    async def load_products():
+        return products
+
+    catalog.register("categories", load_categories)
+    catalog.register("products", load_products)
+    monkeypatch.setattr(server, "catalog", catalog)
+    monkeypatch.setattr(server, "suggester", Suggester())
+    return catalog
+
+
+def test_product_by_slug_and_category_products(monkeypatch):
+    products = [{**PRODUCT, "id": "1"}, {**PRODUCT, "id": "2", "slug": "cashews", "sku": "CSH-1"}]
+    catalog = _cached_catalog(monkeypatch, [{"id": "c1", "slug": "nuts"}, {"id": "c2", "slug": "seeds"}], products)
+    request = SimpleNamespace(headers={})
+
+    response = asyncio.run(server.get_product_by_slug(request, "cashews"))
+    assert json.loads(response.body)["id"] == "2"
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_product_by_slug(request, "walnuts"))
+    assert error.value.status_code == 404
+
+    response = asyncio.run(server.get_category_products(request, "nuts"))
+    assert [p["id"] for p in json.loads(response.body)] == ["1", "2"]
+    # A known category without products is an empty list, an unknown one a 404
+    assert json.loads(asyncio.run(server.get_category_products(request, "seeds")).body) == []
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_category_products(request, "fruit"))
+    assert error.value.status_code == 404
+
+    # Revalidation answers 304 until a write invalidates the products
+    conditional = SimpleNamespace(headers={"if-none-match": response.headers["etag"]})
+    assert asyncio.run(server.get_category_products(conditional, "nuts")).status_code == 304
+    products.append({**PRODUCT, "id": "3", "slug": "walnuts", "sku": "WAL-1"})
+    catalog.invalidate("products")
+    assert asyncio.run(server.get_category_products(conditional, "nuts")).status_code == 200
+    assert json.loads(asyncio.run(server.get_product_by_slug(request, "walnuts")).body)["id"] == "3"
+
+
+def products_page(request, **params):
+    """Call the listing as FastAPI would, with every unset parameter None"""
+    names = ["category", "product_type", "q", "minPrice", "maxPrice", "sort", "limit", "after"]
+    return asyncio.run(server.get_products(request, **{name: params.get(name) for name in names}))
+
+
+def test_product_page_revalidates_before_querying(monkeypatch):
+    db = FakeDb([{**PRODUCT, "id": "1"}])
+    monkeypatch.setattr(server, "db", db)
+    catalog = _cached_catalog(monkeypatch, [], db.products.docs)
+    request = SimpleNamespace(headers={})
+
+    response = products_page(request, category="nuts", limit=10)
+    assert [p["id"] for p in json.loads(response.body)["items"]] == ["1"]
+    assert db.products.queries == 1
+
+    # The same filters, spelled differently, revalidate without a query
+    conditional = SimpleNamespace(headers={"if-none-match": response.headers["etag"]})
+    response = products_page(conditional, category="nuts", q="  ", limit=10)
+    assert response.status_code == 304
+    assert db.products.queries == 1
+    # Other filters are another page
+    assert products_page(conditional, category="nuts", limit=5).status_code == 200
+    assert db.products.queries == 2
+
+    # Until a write to the products
+    catalog.invalidate("products")
+    assert products_page(conditional, category="nuts", limit=10).status_code == 200
+    assert db.products.queries == 3
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Product Search Index Tests for DryFruto Application
+Checks ranking, typo tolerance, prefix expansion and incremental updates
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import ProductSearch, SearchIndex, Suggester
+
+PRODUCTS = [
+    {"id": "1", "name": "Premium California Almonds", "type": "Almonds",
+     "shortDescription": "Crunchy almonds", "description": "Rich in vitamin E", "benefits": ["Heart health"]},
+    {"id": "2", "name": "Jumbo Cashews", "type": "Cashews",
+     "shortDescription": "Creamy cashews", "description": "Buttery and sweet", "benefits": ["Energy"]},
+    {"id": "3", "name": "Mix Dry Fruits", "type": "Mix dry fruits",
+     "shortDescription": "Almonds, cashews and raisins", "description": "A healthy mix", "benefits": []},
+]
+
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+
+def test_name_matches_rank_above_description_matches():
+    index = SearchIndex.from_documents(PRODUCTS)
+    assert ids(index.search("almonds")) == ["1", "3"]
+
+
+def test_typos_are_corrected():
+    index = SearchIndex.from_documents(PRODUCTS)
+    assert ids(index.search("almnd"))[0] == "1"
+    assert ids(index.search("kashew"))[0] == "2"
+
+
+def test_last_term_is_expanded_as_prefix():
+    index = SearchIndex.from_documents(PRODUCTS)
+    assert set(ids(index.search("cash"))) == {"2", "3"}
+
+
+def test_incremental_add_and_remove():
+    index = SearchIndex.from_documents(PRODUCTS)
+    index.add("4", {"id": "4", "name": "Salted Pistachios", "type": "Pistachios"})
+    assert ids(index.search("pistachio")) == ["4"]
+    index.add("4", {"id": "4", "name": "Roasted Walnuts", "type": "Walnuts"})
+    assert ids(index.search("pistachio")) == []
+    index.remove("4")
+    assert ids(index.search("walnut")) == []
+    assert len(index) == 3
+
+
+def test_product_search_rebuilds_only_when_behind():
+    search = ProductSearch()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return PRODUCTS
+
+    async def run():
+        await search.current(1, load)
+        search.apply(2, "9", {"id": "9", "name": "Golden Raisins"})
+        index = await search.current(2, load)
+        assert ids(index.search("golden")) == ["9"]
+        # A write that skipped a version forces a rebuild
+        search.apply(4, "10", {"id": "10", "name": "Dates"})
+        await search.current(4, load)
+
+    asyncio.run(run())
+    assert len(loads) == 2
+
+
+def test_suggestions_match_any_word_and_follow_popularity():
+    suggester = Suggester()
+    products = [dict(p, slug=f"p{p['id']}") for p in PRODUCTS]
+    categories = [{"name": "Dry Fruits", "slug": "dry-fruits"}]
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return products, categories
+
+    async def concurrent_requests():
+        await asyncio.gather(*(suggester.current((1, 1), load) for _ in range(5)))
+
+    asyncio.run(concurrent_requests())
+    # Concurrent requests after a write share one rebuild
+    assert len(loads) == 1
+
+    assert [s["text"] for s in suggester.suggest("cash")] == ["Cashews", "Jumbo Cashews"]
+    assert suggester.suggest("fru")[0] == {"text": "Dry Fruits", "kind": "category", "slug": "dry-fruits"}
+
+    suggester.record("product", "p2")
+    assert suggester.suggest("cash", limit=1)[0]["text"] == "Jumbo Cashews"
+    suggester.record_phrase("cashews")
+    suggester.record_phrase("Cashews")
+    assert suggester.suggest("cash", limit=1)[0]["text"] == "Cashews"
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Upload Storage Backend Tests for DryFruto Application
+Runs the S3 backend against moto's in-process S3 stand-in
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import S3Storage
+
+moto = pytest.importorskip("moto")
+
+
+@pytest.fixture
+def s3_storage(tmp_path, monkeypatch):
+    for name in ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+        monkeypatch.setenv(name, "testing")
+    with moto.mock_aws():
+        import boto3
+        from botocore.config import Config
+        # moto reports whole-object checksums for multipart uploads, which real S3 does not
+        config = Config(response_checksum_validation="when_required")
+        client = boto3.client("s3", region_name="us-east-1", config=config)
+        client.create_bucket(Bucket="media")
+        yield S3Storage("media", prefix="uploads", staging_dir=tmp_path, client=client)
+
+
+def staged(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_s3_store_dedup_and_read(s3_storage, tmp_path):
+    content = os.urandom(9 * 1024 * 1024)  # above the multipart threshold
+    assert asyncio.run(s3_storage.store(staged(tmp_path, "a.part", content), "abc.jpg"))
+    assert not asyncio.run(s3_storage.store(staged(tmp_path, "b.part", content), "abc.jpg"))
+    # Temp files are consumed either way
+    assert not (tmp_path / "a.part").exists() and not (tmp_path / "b.part").exists()
+    assert asyncio.run(s3_storage.read_bytes("abc.jpg")) == content
+    assert asyncio.run(s3_storage.read_bytes("missing.jpg")) is None
+
+    head = s3_storage.client.head_object(Bucket="media", Key="uploads/abc.jpg")
+    assert head["ContentType"] == "image/jpeg"
+
+
+def test_s3_list_skips_variants_and_pages(s3_storage, tmp_path):
+    for name in ["b.png", "a.png", "c.png"]:
+        asyncio.run(s3_storage.store(staged(tmp_path, "x.part", b"12345"), name))
+    asyncio.run(s3_storage.store(staged(tmp_path, "x.part", b"1"), "variants/a-100.webp", overwrite=True))
+
+    first = asyncio.run(s3_storage.list("", 2))
+    assert [(name, size) for name, size, _ in first] == [("a.png", 5), ("b.png", 5)]
+    assert [name for name, _, _ in asyncio.run(s3_storage.list("b.png", 2))] == ["c.png"]
+
+    assert asyncio.run(s3_storage.delete("a.png")) == 5
+    assert asyncio.run(s3_storage.delete("a.png")) == 0
+
+
+def test_s3_local_copy_and_presigned_redirect(s3_storage, tmp_path):
+    asyncio.run(s3_storage.store(staged(tmp_path, "x.part", b"image"), "pic.png"))
+
+    async def copy():
+        async with s3_storage.local_copy("pic.png") as path:
+            data = path.read_bytes()
+        return data, path
+
+    data, path = asyncio.run(copy())
+    assert data == b"image" and not path.exists()
+
+    response = asyncio.run(s3_storage.response(None, "pic.png", "public, max-age=60"))
+    assert response.status_code == 307
+    assert "uploads/pic.png" in response.headers["location"]
+    assert "response-cache-control" in response.headers["location"]
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+def test_s3_response_for_a_missing_object_is_a_404(s3_storage, tmp_path):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(s3_storage.response(None, "missing.png", "public, max-age=60"))
+    assert error.value.status_code == 404
+
+    asyncio.run(s3_storage.store(staged(tmp_path, "x.part", b"image"), "late.png"))
+    assert asyncio.run(s3_storage.response(None, "late.png", "public, max-age=60")).status_code == 307
+    # Deleting drops the remembered hit
+    asyncio.run(s3_storage.delete("late.png"))
+    with pytest.raises(HTTPException):
+        asyncio.run(s3_storage.response(None, "late.png", "public, max-age=60"))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Differential Import Tests for DryFruto Application
+Checks content hashing and the planned inserts, updates and deletes
+"""
+
+import os
+import sys
+
+import pytest
+from pymongo import DeleteMany, InsertOne, ReplaceOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from theme_diff import content_hash, plan_changes
+
+
+def test_content_hash_ignores_key_order_and_mongo_id():
+    assert content_hash({"id": "1", "name": "Almonds"}) == content_hash({"_id": "x", "name": "Almonds", "id": "1"})
+    assert content_hash({"id": "1", "price": 100}) != content_hash({"id": "1", "price": 120})
+
+
+def test_only_differences_are_planned():
+    stored = [{"id": "same", "v": 1}, {"id": "changed", "v": 1}, {"id": "gone", "v": 1}]
+    existing = {doc["id"]: content_hash(doc) for doc in stored}
+    incoming = [{"id": "same", "v": 1}, {"id": "changed", "v": 2}, {"_id": "abc", "id": "new", "v": 1}]
+
+    operations, summary, ids = plan_changes(existing, incoming)
+
+    assert summary == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+    assert ids == {"upserted": ["changed", "new"], "deleted": ["gone"]}
+    assert operations == [
+        DeleteMany({"id": {"$in": ["gone"]}}),
+        ReplaceOne({"id": "changed"}, {"id": "changed", "v": 2}),
+        InsertOne({"id": "new", "v": 1}),
+    ]
+
+
+def test_unchanged_import_plans_nothing():
+    docs = [{"id": str(i), "name": f"Product {i}"} for i in range(2000)]
+    operations, summary, _ = plan_changes({doc["id"]: content_hash(doc) for doc in docs}, docs)
+    assert operations == []
+    assert summary["unchanged"] == 2000
+
+
+def test_missing_documents_can_be_kept():
+    operations, summary, _ = plan_changes({"other": "hash"}, [{"id": "site_settings"}], delete_missing=False)
+    assert summary["deleted"] == 0
+    assert operations == [InsertOne({"id": "site_settings"})]
+
+
+def test_documents_need_an_id():
+    with pytest.raises(ValueError):
+        plan_changes({}, [{"name": "No id"}])
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Streaming Theme Import Tests for DryFruto Application
+Checks incremental NDJSON parsing, validation and batched inserts
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import sys
+
+import pytest
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from theme_import import ThemeImporter, ndjson_records
+
+
+class Item(BaseModel):
+    id: str
+    name: str
+
+
+class Settings(BaseModel):
+    businessName: str = "Shop"
+
+
+class FakeCollection:
+    def __init__(self, db, name, docs=None):
+        self.db = db
+        self.name = name
+        self.docs = list(docs or [])
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(len(docs))
+        self.docs.extend(docs)
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs = [doc]
+
+    async def create_indexes(self, models):
+        pass
+
+    async def drop(self):
+        self.db.pop(self.name, None)
+
+    async def rename(self, name, dropTarget=False):
+        self.db[name] = self.db.pop(self.name)
+        self.name = name
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection(self, name)
+        return self[name]
+
+    def __getattr__(self, name):
+        return self[name]
+
+    async def create_collection(self, name):
+        return self[name]
+
+
+def _lines(*records) -> bytes:
+    return "\n".join(json.dumps(record) for record in records).encode("utf-8")
+
+
+async def _split(body: bytes, size: int = 7):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+async def _records(chunks):
+    return [record async for _, record in ndjson_records(chunks)]
+
+
+def test_lines_are_parsed_across_chunk_boundaries_and_gzip():
+    body = _lines({"a": 1}, {"b": "x" * 50}) + b"\n\n"
+    assert asyncio.run(_records(_split(body))) == [{"a": 1}, {"b": "x" * 50}]
+    assert asyncio.run(_records(_split(gzip.compress(body)))) == [{"a": 1}, {"b": "x" * 50}]
+
+
+def test_malformed_input_is_rejected():
+    with pytest.raises(ValueError, match="Line 2"):
+        asyncio.run(_records(_split(b'{"a": 1}\n{oops\n')))
+    with pytest.raises(ValueError, match="gzip"):
+        asyncio.run(_records(_split(gzip.compress(b'{"a": 1}\n')[:-8])))
+
+
+def test_import_replaces_present_collections_in_batches():
+    db = FakeDb()
+    db["products"] = FakeCollection(db, "products", [{"id": "old", "name": "Old"}])
+    db["categories"] = FakeCollection(db, "categories", [{"id": "kept", "name": "Kept"}])
+    body = _lines(
+        {"exportVersion": "1.0"},
+        {"collection": "siteSettings", "document": {"businessName": "DryFruto"}},
+        *({"collection": "products", "document": {"id": str(i), "name": f"P{i}", "extra": 1}} for i in range(5)),
+    )
+    importer = ThemeImporter(db, {"products": ("products", Item), "categories": ("categories", Item)}, Settings,
+                             batch_size=2)
+    progress = asyncio.run(importer.run(ndjson_records(_split(body, 64))))
+
+    assert progress["state"] == "done"
+    assert progress["inserted"] == {"siteSettings": 1, "products": 5}
+    assert db["products"].batches == [2, 2, 1]
+    assert db["products"].docs[0] == {"id": "0", "name": "P0"}
+    assert db["categories"].docs == [{"id": "kept", "name": "Kept"}]
+    assert db["site_settings"].docs == [{"businessName": "DryFruto", "id": "site_settings"}]
+    assert "products__staging" not in db
+
+
+def test_failed_import_leaves_live_collections_untouched():
+    db = FakeDb()
+    db["products"] = FakeCollection(db, "products", [{"id": "old", "name": "Old"}])
+    body = _lines({"collection": "products", "document": {"id": "1", "name": "New"}}) + b"\n{broken"
+    importer = ThemeImporter(db, {"products": ("products", Item)}, Settings, batch_size=1)
+    with pytest.raises(ValueError):
+        asyncio.run(importer.run(ndjson_records(_split(body))))
+
+    assert importer.progress["state"] == "failed"
+    assert db["products"].docs == [{"id": "old", "name": "Old"}]
+    assert "products__staging" not in db
+
+
+def test_invalid_records_are_skipped_and_reported():
+    db = FakeDb()
+    body = _lines(
+        {"collection": "products", "document": {"id": "1"}},
+        {"collection": "orders", "document": {"id": "2"}},
+        {"collection": "products", "document": {"id": "3", "name": "Ok"}},
+    )
+    importer = ThemeImporter(db, {"products": ("products", Item)}, Settings)
+    progress = asyncio.run(importer.run(ndjson_records(_split(body))))
+
+    assert progress["inserted"] == {"products": 1}
+    assert progress["invalid"] == 2
+    assert progress["errors"][0].startswith("Line 1:")
+    assert "unknown collection 'orders'" in progress["errors"][1]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Upload Serving Tests for DryFruto Application
+Checks range parsing, the file name guard, the stat cache and validators
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upload_files import UploadFiles, parse_range
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=990-2000", 1000) == (990, 999)
+    # Multiple, malformed or foreign-unit ranges are ignored
+    assert parse_range("bytes=0-1,5-6", 1000) is None
+    assert parse_range("bytes=abc", 1000) is None
+    assert parse_range("bytes=5-1", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=1000-", 1000)
+    with pytest.raises(ValueError):
+        parse_range("bytes=-0", 1000)
+
+
+def test_path_rejects_names_outside_upload_dir(tmp_path):
+    files = UploadFiles(tmp_path)
+    assert files.path("photo.jpg") == tmp_path / "photo.jpg"
+    for name in ["..", ".upload-1.part", "../server.py", "a\\b", ""]:
+        with pytest.raises(HTTPException):
+            files.path(name)
+
+
+def test_stat_cache_until_forgotten(tmp_path):
+    files = UploadFiles(tmp_path, cache_size=2)
+    path = tmp_path / "a.png"
+    path.write_bytes(b"1234")
+    assert asyncio.run(files.stat(path)).st_size == 4
+    path.unlink()
+    # Served from the cache until the entry is dropped
+    assert asyncio.run(files.stat(path)).st_size == 4
+    files.forget(path)
+    assert asyncio.run(files.stat(path)) is None
+    assert asyncio.run(files.stat(tmp_path)) is None
+
+
+def test_content_addressed_etag_ignores_mtime(tmp_path):
+    files = UploadFiles(tmp_path)
+    name = "ab" * 32 + ".jpg"
+    path = tmp_path / name
+    path.write_bytes(b"image")
+    first = asyncio.run(files.response(SimpleNamespace(headers={}), path, "immutable"))
+    assert first.headers["etag"] == f'"{"ab" * 32}"'
+
+    # A duplicate upload touches the file; the validator stays the same
+    os.utime(path, (1, 1))
+    files.forget(path)
+    request = SimpleNamespace(headers={"if-none-match": first.headers["etag"]})
+    assert asyncio.run(files.response(request, path, "immutable")).status_code == 304
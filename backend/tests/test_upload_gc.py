@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Upload Garbage Collection Tests for DryFruto Application
+Checks the reference scan, the grace period and incremental batches
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import LocalStorage
+from upload_gc import UploadCollector, find_references
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, *args, **kwargs):
+        return FakeCursor(self.docs)
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        return FakeCollection([])
+
+
+def test_find_references_walks_nested_documents():
+    doc = {
+        "image": "https://shop.example/api/uploads/a.jpg",
+        "images": ["/api/uploads/b.png?w=300&fmt=webp", "https://images.unsplash.com/x.jpg"],
+        "nested": {"logo": "/api/uploads/c.webp"},
+    }
+    assert find_references(doc, set()) == {"a.jpg", "b.png", "c.webp"}
+
+
+def test_collector_removes_old_orphans_with_variants(tmp_path):
+    (tmp_path / "variants").mkdir()
+    for name in ["kept.jpg", "orphan.jpg", "fresh.jpg"]:
+        (tmp_path / name).write_bytes(b"x" * 100)
+    (tmp_path / "variants" / "orphan-100.webp").write_bytes(b"y" * 10)
+    manifest = json.dumps({"source": "orphan.jpg", "variants": [{"width": 100, "format": "webp", "file": "orphan-100.webp"}]})
+    (tmp_path / "variants" / "orphan.jpg.json").write_text(manifest)
+    old = time.time() - 7200
+    for name in ["kept.jpg", "orphan.jpg"]:
+        os.utime(tmp_path / name, (old, old))
+
+    db = FakeDb(products=FakeCollection([{"image": "/api/uploads/kept.jpg"}]))
+    deleted = []
+    collector = UploadCollector(db, LocalStorage(tmp_path), grace_period=3600, on_delete=deleted.append)
+    report = asyncio.run(collector.run())
+
+    assert deleted == ["orphan.jpg"]
+    assert report["deleted"] == 1
+    assert report["reclaimedBytes"] == 100 + 10 + len(manifest)
+    assert sorted(os.listdir(tmp_path)) == ["fresh.jpg", "kept.jpg", "variants"]
+    assert os.listdir(tmp_path / "variants") == []
+
+
+def test_collector_works_in_batches(tmp_path):
+    for i in range(5):
+        (tmp_path / f"{i}.jpg").write_bytes(b"x")
+    collector = UploadCollector(FakeDb(), LocalStorage(tmp_path), grace_period=3600, batch_size=2)
+    scanned = [asyncio.run(collector.run())["scanned"] for _ in range(4)]
+    assert scanned == [2, 2, 1, 2]
+    assert collector.totals["runs"] == 4
+
+
+def test_collector_sees_references_written_elsewhere(tmp_path):
+    old = time.time() - 7200
+    for name in ["a.jpg", "b.jpg"]:
+        (tmp_path / name).write_bytes(b"x")
+        os.utime(tmp_path / name, (old, old))
+    db = FakeDb(products=FakeCollection([{"image": "/api/uploads/a.jpg"}]))
+    collector = UploadCollector(db, LocalStorage(tmp_path), grace_period=3600, batch_size=1)
+    assert asyncio.run(collector.run())["deleted"] == 0
+
+    # Another replica now points at b.jpg; no local cache version changed
+    db["products"] = FakeCollection([{"image": "/api/uploads/b.jpg"}])
+    assert asyncio.run(collector.run())["deleted"] == 0
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "b.jpg"]
+
+
+def test_collector_rereads_references_only_when_needed(tmp_path):
+    old = time.time() - 7200
+    for i in range(4):
+        (tmp_path / f"{i}.jpg").write_bytes(b"x")
+        os.utime(tmp_path / f"{i}.jpg", (old, old))
+    reads = []
+
+    class CountingCollection(FakeCollection):
+        def find(self, *args, **kwargs):
+            reads.append(1)
+            return super().find(*args, **kwargs)
+
+    db = FakeDb(products=CountingCollection([{"image": f"/api/uploads/{i}.jpg"} for i in range(4)]))
+    revision = {"value": 1}
+
+    async def current_revision():
+        return revision["value"]
+
+    collector = UploadCollector(db, LocalStorage(tmp_path), revision=current_revision, grace_period=3600, batch_size=1)
+    asyncio.run(collector.run())
+    asyncio.run(collector.run())
+    assert len(reads) == 1
+    # A content write anywhere moves the revision
+    revision["value"] = 2
+    asyncio.run(collector.run())
+    assert len(reads) == 2
+    assert collector.totals["deleted"] == 0
+
+
+def test_local_listing_is_taken_once_per_walk(tmp_path):
+    storage = LocalStorage(tmp_path)
+    for name in ["a.jpg", "b.jpg", "c.jpg"]:
+        (tmp_path / name).write_bytes(b"x")
+    assert [name for name, _, _ in asyncio.run(storage.list("", 2))] == ["a.jpg", "b.jpg"]
+    (tmp_path / "bb.jpg").write_bytes(b"x")
+    (tmp_path / "c.jpg").unlink()
+    # Later pages come from the same listing; vanished files are skipped
+    assert asyncio.run(storage.list("b.jpg", 2)) == []
+    assert [name for name, _, _ in asyncio.run(storage.list("", 10))] == ["a.jpg", "b.jpg", "bb.jpg"]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Upload Storage Tests for DryFruto Application
+Checks chunked content-addressed saving, deduplication, the size limit
+and cleanup of partial files
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import LocalStorage
+from uploads import UploadTooLarge, is_content_addressed, save_upload
+
+
+class FakeUpload:
+    def __init__(self, content: bytes):
+        self.stream = io.BytesIO(content)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+
+def test_save_upload_writes_file_atomically(tmp_path):
+    content = os.urandom(3 * 1024 * 1024 + 17)
+    filename, size, created = asyncio.run(save_upload(FakeUpload(content), LocalStorage(tmp_path), "jpg", 10 * 1024 * 1024))
+    assert filename == f"{hashlib.sha256(content).hexdigest()}.jpg"
+    assert is_content_addressed(filename)
+    assert size == len(content) and created
+    assert (tmp_path / filename).read_bytes() == content
+    assert os.listdir(tmp_path) == [filename]
+
+
+def test_save_upload_deduplicates_content(tmp_path):
+    content = b"same image bytes"
+    first = asyncio.run(save_upload(FakeUpload(content), LocalStorage(tmp_path), "png", 1024))
+    second = asyncio.run(save_upload(FakeUpload(content), LocalStorage(tmp_path), "png", 1024))
+    assert first[0] == second[0]
+    assert first[2] and not second[2]
+    assert os.listdir(tmp_path) == [first[0]]
+    assert not is_content_addressed("3f2c9a54-7f1e-4d0c-9b1a-2a6f0c1d9e8b.png")
+
+
+def test_save_upload_rejects_oversized_file(tmp_path):
+    with pytest.raises(UploadTooLarge) as exc:
+        asyncio.run(save_upload(FakeUpload(b"x" * (2 * 1024 * 1024 + 1)), LocalStorage(tmp_path), "jpg", 2 * 1024 * 1024))
+    assert exc.value.status_code == 413
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Queue Tests for DryFruto Application
+Checks journaling, batched flushes, retries, replay and backpressure
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from write_behind import QueueFull, WriteBehindQueue
+
+
+class FakeCollection:
+    """insert_many with a unique `id`, optionally failing the next calls"""
+
+    def __init__(self):
+        self.docs = {}
+        self.calls = 0
+        self.fail = 0
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.fail:
+            self.fail -= 1
+            raise AutoReconnect("connection refused")
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc["id"] in self.docs:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.docs[doc["id"]] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+
+def _journal(tmp_path):
+    return sorted(p.name for p in tmp_path.glob("journal-*.ndjson"))
+
+
+def test_submissions_are_journaled_then_flushed_in_one_batch(tmp_path):
+    async def scenario():
+        db = FakeDb()
+        queue = WriteBehindQueue(db, tmp_path, flush_interval=60)
+        await queue.start()
+        await asyncio.gather(*(queue.submit("bulk_orders", {"id": str(i)}) for i in range(20)))
+        assert queue.pending == 20
+        assert len((tmp_path / _journal(tmp_path)[0]).read_bytes().splitlines()) == 20
+        assert await queue.flush() == 20
+        await queue.stop()
+        return db, queue
+
+    db, queue = asyncio.run(scenario())
+    assert len(db["bulk_orders"].docs) == 20
+    assert db["bulk_orders"].calls == 1
+    assert queue.stats()["pending"] == 0
+    assert len(_journal(tmp_path)) == 1
+
+
+def test_failed_flush_keeps_documents_and_journal(tmp_path):
+    async def scenario():
+        db = FakeDb()
+        db["newsletter"].fail = 1
+        queue = WriteBehindQueue(db, tmp_path, flush_interval=60)
+        await queue.start()
+        await queue.submit("newsletter", {"id": "a"})
+        assert await queue.flush() == 0
+        assert queue.pending == 1
+        assert len(_journal(tmp_path)) == 2
+        assert await queue.flush() == 1
+        await queue.stop()
+        return db
+
+    db = asyncio.run(scenario())
+    assert list(db["newsletter"].docs) == ["a"]
+    assert len(_journal(tmp_path)) == 1
+
+
+def test_journal_is_replayed_and_duplicates_are_ignored(tmp_path):
+    async def crash():
+        db = FakeDb()
+        queue = WriteBehindQueue(db, tmp_path, flush_interval=60)
+        await queue.start()
+        await queue.submit("bulk_orders", {"id": "1"})
+        await queue.submit("bulk_orders", {"id": "2"})
+        for task in queue._tasks:
+            task.cancel()
+
+    async def restart():
+        db = FakeDb()
+        db["bulk_orders"].docs["1"] = {"id": "1"}
+        queue = WriteBehindQueue(db, tmp_path, flush_interval=60)
+        await queue.start()
+        await queue.stop()
+        return db, queue
+
+    asyncio.run(crash())
+    db, queue = asyncio.run(restart())
+    assert sorted(db["bulk_orders"].docs) == ["1", "2"]
+    assert queue.totals["duplicates"] == 1
+    assert len(_journal(tmp_path)) == 1
+
+
+def test_full_queue_refuses_submissions(tmp_path):
+    async def scenario():
+        queue = WriteBehindQueue(FakeDb(), tmp_path, flush_interval=60, max_pending=2)
+        await queue.start()
+        await queue.submit("bulk_orders", {"id": "1"})
+        await queue.submit("bulk_orders", {"id": "2"})
+        with pytest.raises(QueueFull):
+            await queue.submit("bulk_orders", {"id": "3"})
+        await queue.stop()
+        return queue
+
+    assert asyncio.run(scenario()).totals["rejected"] == 1
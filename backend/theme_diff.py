@@ -0,0 +1,82 @@
+"""
+Differential theme imports.
+
+A routine sync between two stores re-imports an export in which only a few
+documents changed. Instead of rewriting whole collections, `plan_collection`
+matches the incoming documents to the stored ones by `id`, compares a
+content hash of each pair, and plans a single bulk_write with only the
+inserts, replacements and deletes needed. Unchanged documents are not
+written at all, so they cause no index or oplog churn.
+
+Hashes are computed over canonical JSON (sorted keys, `_id` left out). Only
+the id → hash map of the stored documents is kept in memory.
+"""
+
+import hashlib
+import json
+
+from pymongo import DeleteMany, InsertOne, ReplaceOne
+
+# Stored documents are hashed while the cursor streams them in batches of this size
+HASH_BATCH_SIZE = 1000
+
+
+def content_hash(doc: dict) -> str:
+    """Hash of `doc` that ignores key order and the Mongo `_id`"""
+    body = json.dumps(
+        {key: value for key, value in doc.items() if key != "_id"},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def plan_changes(existing: dict, incoming: list, delete_missing: bool = True):
+    """(operations, summary, ids) turning documents hashed as `existing` (id → hash) into `incoming`
+
+    `ids` lists the "upserted" and "deleted" document ids.
+
+    Raises ValueError when an incoming document has no `id`. When several
+    documents share an id, the last one wins.
+    """
+    wanted = {}
+    for doc in incoming:
+        if not isinstance(doc, dict) or not doc.get("id"):
+            raise ValueError("Every document needs an id for a differential import")
+        wanted[doc["id"]] = {key: value for key, value in doc.items() if key != "_id"}
+
+    inserts, replaces, upserted = [], [], []
+    unchanged = 0
+    for doc_id, doc in wanted.items():
+        stored = existing.get(doc_id)
+        if stored is None:
+            inserts.append(InsertOne(doc))
+        elif stored != content_hash(doc):
+            replaces.append(ReplaceOne({"id": doc_id}, doc))
+        else:
+            unchanged += 1
+            continue
+        upserted.append(doc_id)
+    removed = [doc_id for doc_id in existing if doc_id not in wanted] if delete_missing else []
+
+    # Deletes first, so that a new document may take over the slug of a removed one
+    operations = ([DeleteMany({"id": {"$in": removed}})] if removed else []) + replaces + inserts
+    summary = {"inserted": len(inserts), "updated": len(replaces), "deleted": len(removed), "unchanged": unchanged}
+    return operations, summary, {"upserted": upserted, "deleted": removed}
+
+
+async def stored_hashes(collection) -> dict:
+    """id → content hash of every document in `collection`"""
+    hashes = {}
+    async for doc in collection.find({}, {"_id": 0}).batch_size(HASH_BATCH_SIZE):
+        if doc.get("id"):
+            hashes[doc["id"]] = content_hash(doc)
+    return hashes
+
+
+async def plan_collection(collection, incoming: list, delete_missing: bool = True):
+    """plan_changes() of `incoming` against the documents stored in `collection`"""
+    return plan_changes(await stored_hashes(collection), incoming, delete_missing)
+
+
+def has_changes(summary: dict) -> bool:
+    return bool(summary["inserted"] or summary["updated"] or summary["deleted"])
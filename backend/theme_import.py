@@ -0,0 +1,198 @@
+"""
+Streaming import of NDJSON theme exports.
+
+The body is read as it is uploaded, gunzipped on the fly when it starts with
+the gzip magic bytes, and split into lines. Only one line and one batch of
+documents per collection are ever held in memory. Each record is validated
+against the Pydantic model of its collection and inserted in batches of
+`IMPORT_BATCH_SIZE` with insert_many(ordered=False). The next batch is
+parsed while the previous one is being written.
+
+The input is the layout written by export-theme?format=ndjson: a header
+line, then one {"collection": ..., "document": ...} record per line. Every
+collection present in the file is loaded into a staging collection and
+swapped in once the whole file has been read (see collection_swap), so the
+storefront keeps serving the old content until then and a failed import
+changes nothing. Collections missing from the file are left alone, as with
+the JSON import. Records that fail validation are skipped and counted. The
+first few error messages are kept in the progress report.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import zlib
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from collection_swap import CollectionSwap
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+MAX_REPORTED_ERRORS = 20
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+async def ndjson_records(chunks):
+    """(line number, parsed value) for each non-blank line of the async byte stream `chunks`
+
+    Raises ValueError for malformed JSON, a bad gzip stream or a line longer
+    than MAX_LINE_BYTES.
+    """
+    decompressor = None
+    started = False
+    pending = b""
+    number = 0
+    async for chunk in chunks:
+        if not started and chunk:
+            started = True
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if decompressor is not None:
+            try:
+                chunk = decompressor.decompress(chunk)
+            except zlib.error as e:
+                raise ValueError(f"Invalid gzip data: {e}")
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if len(pending) > MAX_LINE_BYTES:
+            raise ValueError(f"Line {number + len(lines) + 1} is longer than {MAX_LINE_BYTES} bytes")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, _parse(line, number)
+    if decompressor is not None and not decompressor.eof:
+        raise ValueError("Truncated gzip data")
+    if pending.strip():
+        yield number + 1, _parse(pending, number + 1)
+
+
+def _parse(line: bytes, number: int):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Line {number} is not valid JSON: {e}")
+
+
+class ThemeImporter:
+    """Validated, batched loading of theme records into `db`
+
+    `collections` maps the export keys ("products", ...) to (collection
+    name, model). `settings_model` validates the single siteSettings record.
+    """
+
+    def __init__(self, db, collections: dict, settings_model, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.collections = collections
+        self.settings_model = settings_model
+        self.batch_size = batch_size
+        self.progress = None
+        self._started = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _error(self, message: str):
+        self.progress["invalid"] += 1
+        if len(self.progress["errors"]) < MAX_REPORTED_ERRORS:
+            self.progress["errors"].append(message)
+
+    async def _insert(self, collection, key: str, docs: list):
+        try:
+            await collection.insert_many(docs, ordered=False)
+            inserted = len(docs)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            inserted = len(docs) - len(errors)
+            for error in errors:
+                self._error(f"{key}: {error.get('errmsg', error)}")
+        self.progress["inserted"][key] = self.progress["inserted"].get(key, 0) + inserted
+
+    def _validate(self, model, number: int, document):
+        try:
+            return model(**document).model_dump()
+        except ValidationError as e:
+            error = e.errors()[0]
+            self._error(f"Line {number}: {error['msg']} at {error['loc']}")
+            return None
+
+    async def _load(self, swap, records):
+        """Stage the documents of `records`; returns the validated site settings, if any"""
+        batches = {}
+        writing = None
+        settings = None
+        try:
+            async for number, record in records:
+                self.progress["lines"] = number
+                if not isinstance(record, dict):
+                    self._error(f"Line {number}: expected an object")
+                    continue
+                key = record.get("collection")
+                if key is None and "exportVersion" in record:
+                    continue
+                if key != "siteSettings" and key not in self.collections:
+                    self._error(f"Line {number}: unknown collection {key!r}")
+                    continue
+                document = record.get("document")
+                if not isinstance(document, dict):
+                    self._error(f"Line {number}: missing document")
+                    continue
+
+                if key == "siteSettings":
+                    settings = self._validate(self.settings_model, number, document) or settings
+                    continue
+                doc = self._validate(self.collections[key][1], number, document)
+                if doc is None:
+                    continue
+                batch = batches.setdefault(key, [])
+                batch.append(doc)
+                if len(batch) >= self.batch_size:
+                    staging = await swap.stage(self.collections[key][0])
+                    # Keep one write in flight while the next batch is parsed
+                    if writing is not None:
+                        await writing
+                    writing = asyncio.ensure_future(self._insert(staging, key, batches.pop(key)))
+                    self.progress["durationMs"] = round((time.perf_counter() - self._started) * 1000, 1)
+
+            if writing is not None:
+                await writing
+                writing = None
+            for key, batch in batches.items():
+                await self._insert(await swap.stage(self.collections[key][0]), key, batch)
+            return settings
+        finally:
+            if writing is not None and not writing.done():
+                writing.cancel()
+
+    async def run(self, records) -> dict:
+        """Import the (line number, record) pairs of `records`; returns the final progress"""
+        async with self._lock:
+            self._started = time.perf_counter()
+            self.progress = {
+                "state": "running", "lines": 0, "inserted": {}, "invalid": 0, "errors": [], "durationMs": 0,
+            }
+            try:
+                async with CollectionSwap(self.db) as swap:
+                    settings = await self._load(swap, records)
+                if settings is not None:
+                    settings["id"] = "site_settings"
+                    await self.db.site_settings.replace_one({"id": "site_settings"}, settings, upsert=True)
+                    self.progress["inserted"]["siteSettings"] = 1
+                self.progress["state"] = "done"
+            except BaseException:
+                self.progress["state"] = "failed"
+                raise
+            finally:
+                self.progress["durationMs"] = round((time.perf_counter() - self._started) * 1000, 1)
+                logger.info(f"Theme import {self.progress['state']}: {self.progress['inserted']}, "
+                            f"{self.progress['invalid']} invalid records")
+            return self.progress
@@ -0,0 +1,169 @@
+"""
+Serving of uploaded files.
+
+`UploadFiles` maps request file names to paths inside the upload directory
+(refusing anything that could escape it) and answers requests for them:
+
+- stat() calls run in the thread pool, and their results are kept in a
+  small LRU, so repeated requests for popular images skip the filesystem;
+- conditional requests get a 304 before the file is opened;
+- single byte ranges get a 206 with only the requested bytes;
+- when an X-Accel-Redirect prefix is configured, the response carries only
+  headers and nginx sends the file itself with sendfile.
+"""
+
+import asyncio
+import mimetypes
+import os
+import stat
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import quote
+
+from fastapi import HTTPException
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+from catalog_cache import not_modified
+from uploads import is_content_addressed
+
+CHUNK_SIZE = 256 * 1024
+
+
+def parse_range(header: str, size: int):
+    """(start, end) of a single `bytes=` range, inclusive; None to ignore the header
+
+    Raises ValueError when the range cannot be satisfied. Multiple ranges
+    are ignored and the whole file is sent, which RFC 9110 allows.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and start > end:
+            return None
+    else:
+        length = int(last)
+        if length == 0:
+            raise ValueError("Range not satisfiable")
+        start, end = max(0, size - length), size - 1
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def check_filename(filename: str) -> str:
+    """`filename` if it names an upload; 404 for names that are hidden or could leave the directory
+
+    Names starting with "." cover "..", "." and the temp files of uploads in
+    progress.
+    """
+    if not filename or filename.startswith(".") or any(c in filename for c in "/\\\0"):
+        raise HTTPException(status_code=404, detail="File not found")
+    return filename
+
+
+def _read_range(path: Path, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class UploadFiles:
+    """Resolves and serves files below `root`"""
+
+    def __init__(self, root: Path, accel_prefix: str = None, cache_size: int = 1024, cache_ttl: float = 60.0):
+        self.root = root
+        self.accel_prefix = accel_prefix.rstrip("/") + "/" if accel_prefix else None
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._stats = OrderedDict()
+
+    def path(self, filename: str) -> Path:
+        """Path of the upload `filename` (see check_filename)"""
+        return self.root / check_filename(filename)
+
+    async def stat(self, path: Path):
+        """stat() of the regular file at `path`, or None when there is none"""
+        key = str(path)
+        entry = self._stats.get(key)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            self._stats.move_to_end(key)
+            return entry[1]
+        try:
+            result = await asyncio.to_thread(os.stat, path)
+        except (FileNotFoundError, NotADirectoryError):
+            self._stats.pop(key, None)
+            return None
+        if not stat.S_ISREG(result.st_mode):
+            return None
+        self._stats[key] = (now + self.cache_ttl, result)
+        self._stats.move_to_end(key)
+        while len(self._stats) > self.cache_size:
+            self._stats.popitem(last=False)
+        return result
+
+    def forget(self, path: Path):
+        """Drop the cached stat() of `path` after it was replaced or deleted"""
+        self._stats.pop(str(path), None)
+
+    async def response(self, request, path: Path, cache_control: str):
+        """Conditional, ranged or accelerated response for the file at `path`"""
+        stat_result = await self.stat(path)
+        if stat_result is None:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        if is_content_addressed(path.name):
+            # The name is the SHA-256 of the bytes. The mtime is not stable: storing a
+            # duplicate touches the file, so any copy the client holds is current.
+            etag = '"%s"' % path.stem
+            modified = 0
+        else:
+            etag = '"%x-%x"' % (int(stat_result.st_mtime), stat_result.st_size)
+            modified = stat_result.st_mtime
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "Cache-Control": cache_control,
+            "Accept-Ranges": "bytes",
+        }
+        if not_modified(request.headers, etag, modified):
+            return Response(status_code=304, headers=headers)
+
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if self.accel_prefix:
+            # nginx serves the bytes (and any Range) from the shared volume
+            relative = path.relative_to(self.root).as_posix()
+            headers["X-Accel-Redirect"] = self.accel_prefix + quote(relative)
+            return Response(status_code=200, headers=headers, media_type=media_type)
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (not if_range or if_range in (etag, headers["Last-Modified"])):
+            size = stat_result.st_size
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            if byte_range is not None:
+                start, end = byte_range
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                headers["Content-Length"] = str(end - start + 1)
+                return StreamingResponse(
+                    _read_range(path, start, end), status_code=206, headers=headers, media_type=media_type
+                )
+
+        return FileResponse(path, stat_result=stat_result, headers=headers, media_type=media_type)
@@ -0,0 +1,144 @@
+"""
+Garbage collection of uploads no document refers to.
+
+Deleting or editing a product, slide, testimonial or gift box leaves its old
+images in the upload storage. `UploadCollector` keeps a reference index of
+every upload URL found anywhere in the storefront documents and deletes
+files missing from it, once they are older than a grace period. The grace
+period keeps images that were just uploaded but not yet saved into a
+document.
+
+Each run looks at one batch of files, continuing from where the previous
+run stopped. The index is read from the database at the start of each walk
+over the files, and again whenever the store-wide content revision (see
+change_log) has moved. The revision lives in Mongo, so writes made by
+other replicas are noticed; content changed outside the API (a restore, a
+manual edit) is picked up by the next walk. When a batch holds deletion
+candidates, the revision is checked once more just before deleting, which
+covers documents saved while the batch was being checked.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+
+from image_variants import VARIANT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Collections whose documents may point at uploads
+REFERENCING_COLLECTIONS = ("categories", "products", "hero_slides", "testimonials", "gift_boxes", "site_settings")
+
+UPLOAD_REFERENCE = re.compile(r"/uploads/([^/?#\s\"']+)")
+
+TEMP_PREFIX = ".upload-"
+
+
+def find_references(value, found: set) -> set:
+    """Add the upload file names mentioned anywhere in `value` to `found`"""
+    if isinstance(value, str):
+        found.update(UPLOAD_REFERENCE.findall(value))
+    elif isinstance(value, dict):
+        for item in value.values():
+            find_references(item, found)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            find_references(item, found)
+    return found
+
+
+class UploadCollector:
+    """Incremental mark-and-sweep over the uploads in a storage backend"""
+
+    def __init__(self, db, storage, revision=None, grace_period: float = 86400, batch_size: int = 500,
+                 on_delete=None):
+        self.db = db
+        self.storage = storage
+        self.revision = revision
+        self.grace_period = grace_period
+        self.batch_size = batch_size
+        self.on_delete = on_delete
+        self.position = ""
+        self._index = None
+        self._index_revision = None
+        self._lock = asyncio.Lock()
+        self.totals = {"runs": 0, "scanned": 0, "deleted": 0, "reclaimedBytes": 0, "lastRun": None}
+
+    async def references(self, refresh: bool = False) -> set:
+        """Upload names referenced by the storefront documents, re-read when the content revision moved"""
+        revision = await self.revision() if self.revision is not None else None
+        if refresh or self._index is None or revision is None or revision != self._index_revision:
+            found = set()
+            for name in REFERENCING_COLLECTIONS:
+                async for doc in self.db[name].find({}, {"_id": 0}):
+                    find_references(doc, found)
+            self._index, self._index_revision = found, revision
+        return self._index
+
+    async def _remove(self, name: str) -> int:
+        """Delete an upload together with its image variants; returns the bytes freed"""
+        freed = 0
+        manifest_key = f"{VARIANT_DIR}/{name}.json"
+        try:
+            manifest = json.loads(await self.storage.read_bytes(manifest_key) or b"null")
+        except ValueError:
+            manifest = None
+        if manifest:
+            for variant in manifest.get("variants", []):
+                freed += await self.storage.delete(f"{VARIANT_DIR}/{variant['file']}")
+            freed += await self.storage.delete(manifest_key)
+        return freed + await self.storage.delete(name)
+
+    async def run(self) -> dict:
+        """Sweep the next batch of files and return what was reclaimed"""
+        async with self._lock:
+            started = time.perf_counter()
+            # A new walk re-reads everything, catching content changed outside the API
+            references = await self.references(refresh=not self.position)
+            batch = await self.storage.list(self.position, self.batch_size)
+            # Start over from the top once the end of the listing is reached
+            self.position = batch[-1][0] if len(batch) == self.batch_size else ""
+
+            cutoff = time.time() - self.grace_period
+            candidates = [
+                name for name, _, modified in batch
+                if name not in references and modified <= cutoff
+                and not (name.startswith(".") and not name.startswith(TEMP_PREFIX))
+            ]
+            if candidates:
+                # A document may have been saved while this batch was checked
+                references = await self.references()
+            deleted, reclaimed = [], 0
+            for name in candidates:
+                if name in references:
+                    continue
+                reclaimed += await self._remove(name)
+                deleted.append(name)
+                if self.on_delete is not None:
+                    self.on_delete(name)
+
+            report = {
+                "scanned": len(batch),
+                "deleted": len(deleted),
+                "reclaimedBytes": reclaimed,
+                "durationMs": round((time.perf_counter() - started) * 1000, 1),
+            }
+            self.totals["runs"] += 1
+            self.totals["scanned"] += len(batch)
+            self.totals["deleted"] += len(deleted)
+            self.totals["reclaimedBytes"] += reclaimed
+            self.totals["lastRun"] = time.time()
+            if deleted:
+                logger.info(f"Upload GC removed {len(deleted)} orphaned files, reclaiming {reclaimed} bytes")
+            return report
+
+    async def run_forever(self, interval: float):
+        """Run a batch every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Upload GC failed: {e}")
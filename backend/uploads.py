@@ -0,0 +1,155 @@
+"""
+Streaming storage of uploaded files.
+
+The request body is never held in memory as a whole: `UploadSizeLimit`
+counts the bytes as the ASGI server delivers them and rejects the request
+with 413 as soon as the limit is passed. `save_upload` then copies the
+upload chunk by chunk into a temporary file (disk writes run in the thread
+pool) and hands the finished file to the storage backend, so readers never
+see a partial file.
+
+Files are content-addressed: they are named after the SHA-256 of their
+bytes, computed while streaming. Uploading the same image twice resolves to
+the existing file, and since a name can never point at other content, the
+URLs can be cached forever.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from fastapi import HTTPException
+
+CHUNK_SIZE = 1024 * 1024
+
+# File extension per accepted content type
+UPLOAD_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+class UploadTooLarge(HTTPException):
+    """The upload exceeds the configured maximum size
+
+    An HTTPException so that FastAPI passes it through (rather than turning
+    it into a 400) when it is raised while the request body is parsed.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(
+            status_code=413, detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)} MB."
+        )
+        self.max_bytes = max_bytes
+
+
+class UploadSizeLimit:
+    """ASGI middleware rejecting request bodies over `max_bytes` on the upload paths
+
+    Checks Content-Length up front and counts the body while it streams in,
+    which also covers chunked requests without a Content-Length.
+    """
+
+    def __init__(self, app, paths, max_bytes: int):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await self._reject(send)
+                return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge(self.max_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            if started:
+                raise
+            await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": UploadTooLarge(self.max_bytes).detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _open_temp(directory: Path):
+    fd, path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    return os.fdopen(fd, "wb"), path
+
+
+def _discard(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def is_content_addressed(filename: str) -> bool:
+    return CONTENT_ADDRESSED_NAME.match(filename) is not None
+
+
+async def save_upload(upload, storage, extension: str, max_bytes: int):
+    """Stream `upload` into `storage`, named after its SHA-256
+
+    Returns (filename, size, created); `created` is False when a file with
+    the same content already existed. Raises UploadTooLarge (leaving nothing
+    behind) once more than `max_bytes` have been read.
+    """
+    out, temp_path = await asyncio.to_thread(_open_temp, storage.staging_dir)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        try:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+        finally:
+            await asyncio.to_thread(out.close)
+        filename = f"{digest.hexdigest()}.{extension}"
+        created = await storage.store(temp_path, filename)
+    except BaseException:
+        await asyncio.to_thread(_discard, temp_path)
+        raise
+    return filename, size, created
@@ -0,0 +1,241 @@
+"""
+Write-behind queue for form submissions.
+
+During campaign bursts every bulk-order inquiry and newsletter signup used
+to be its own insert_one. With the queue enabled, a submission is appended
+to a local journal and acknowledged once the journal is fsynced. A
+background task writes the queued documents to Mongo with
+insert_many(ordered=False), every `flush_interval` seconds or as soon as
+`batch_size` documents are waiting.
+
+- Journal writes are group-committed: every submission that arrives while
+  an fsync is running shares the next one.
+- The journal is a series of segment files. A flush starts a new segment
+  and deletes the old ones only after Mongo has accepted their documents,
+  so a crash at any point leaves every unflushed submission on disk. The
+  segments are replayed on the next start.
+- A document may be written twice when a flush is retried or replayed.
+  The unique indexes on `id` (and on newsletter `email`) reject the
+  second copy, and duplicate-key errors count as success.
+- At most `max_pending` documents are held. Beyond that, submissions are
+  refused with a 503 until the database catches up.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+SEGMENT_PREFIX = "journal-"
+
+
+class QueueFull(HTTPException):
+    """Raised when the queue holds `max_pending` documents"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=503,
+            detail="Too many submissions right now, please try again",
+            headers={"Retry-After": "1"},
+        )
+
+
+class WriteBehindQueue:
+    """Journaled, batched inserts into the collections of `db`"""
+
+    def __init__(self, db, journal_dir: Path, flush_interval: float = 0.2, batch_size: int = 500,
+                 max_pending: int = 10000):
+        self.db = db
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._incoming = []
+        self._buffer = []
+        self._sealed = []
+        self._segment = None
+        self._segment_file = None
+        self._segment_lock = asyncio.Lock()
+        self._journal_wanted = asyncio.Event()
+        self._flush_wanted = asyncio.Event()
+        self._tasks = []
+        self.totals = {"submitted": 0, "flushed": 0, "duplicates": 0, "batches": 0, "failures": 0, "rejected": 0}
+
+    @property
+    def pending(self) -> int:
+        """Documents accepted but not yet written to Mongo"""
+        return len(self._incoming) + len(self._buffer)
+
+    def _segment_paths(self) -> list:
+        return sorted(self.journal_dir.glob(f"{SEGMENT_PREFIX}*.ndjson"))
+
+    def _open_segment(self):
+        """Start a new journal segment numbered after every existing one"""
+        paths = self._segment_paths()
+        number = int(paths[-1].stem[len(SEGMENT_PREFIX):]) + 1 if paths else 1
+        self._segment = self.journal_dir / f"{SEGMENT_PREFIX}{number:012d}.ndjson"
+        self._segment_file = open(self._segment, "ab")
+
+    def _replay(self) -> int:
+        """Load the documents of journal segments left by a previous run"""
+        replayed = 0
+        for path in self._segment_paths():
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line of a crashed run may be torn
+                        continue
+                    self._buffer.append((entry["c"], entry["d"]))
+                    replayed += 1
+            self._sealed.append(path)
+        return replayed
+
+    async def start(self):
+        """Replay the journal and start the background tasks"""
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        replayed = await asyncio.to_thread(self._replay)
+        if replayed:
+            logger.info(f"Replaying {replayed} journaled submissions")
+        self._open_segment()
+        self._tasks = [asyncio.create_task(self._journal_loop()), asyncio.create_task(self._flush_loop())]
+        if self._buffer:
+            self._flush_wanted.set()
+
+    async def submit(self, collection: str, doc: dict):
+        """Queue `doc` for insertion into `collection`, returning once it is journaled"""
+        if self.pending >= self.max_pending:
+            self.totals["rejected"] += 1
+            raise QueueFull()
+        future = asyncio.get_running_loop().create_future()
+        self._incoming.append((collection, doc, future))
+        self._journal_wanted.set()
+        await future
+        self.totals["submitted"] += 1
+
+    def _append(self, lines: list):
+        self._segment_file.write(b"".join(lines))
+        self._segment_file.flush()
+        os.fsync(self._segment_file.fileno())
+
+    async def _write_journal(self):
+        async with self._segment_lock:
+            entries, self._incoming = self._incoming, []
+            lines = [
+                json.dumps({"c": collection, "d": doc}, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+                for collection, doc, _ in entries
+            ]
+            try:
+                await asyncio.to_thread(self._append, lines)
+            except OSError as e:
+                logger.error(f"Could not journal {len(entries)} submissions: {e}")
+                for _, _, future in entries:
+                    if not future.done():
+                        future.set_exception(HTTPException(status_code=503, detail="Submission could not be saved"))
+                return
+            self._buffer.extend((collection, doc) for collection, doc, _ in entries)
+        for _, _, future in entries:
+            if not future.done():
+                future.set_result(None)
+        if len(self._buffer) >= self.batch_size:
+            self._flush_wanted.set()
+
+    async def _journal_loop(self):
+        while True:
+            await self._journal_wanted.wait()
+            self._journal_wanted.clear()
+            if self._incoming:
+                await self._write_journal()
+
+    async def _insert(self, collection: str, docs: list):
+        try:
+            await self.db[collection].insert_many(docs, ordered=False)
+            self.totals["flushed"] += len(docs)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            duplicates = sum(1 for error in errors if error.get("code") == DUPLICATE_KEY)
+            self.totals["duplicates"] += duplicates
+            self.totals["flushed"] += len(docs) - len(errors)
+            if len(errors) > duplicates:
+                # Retrying cannot fix a document the server rejects
+                logger.error(f"Dropped {len(errors) - duplicates} queued {collection} documents: {errors[0]}")
+
+    async def flush(self) -> int:
+        """Write every journaled document to Mongo; returns how many were written
+
+        On failure the documents stay queued and their journal segments stay
+        on disk, to be retried by the next flush.
+        """
+        async with self._segment_lock:
+            if not self._buffer:
+                return 0
+            batch, self._buffer = self._buffer, []
+            self._segment_file.close()
+            self._sealed.append(self._segment)
+            self._open_segment()
+
+        started = time.perf_counter()
+        by_collection = {}
+        for collection, doc in batch:
+            by_collection.setdefault(collection, []).append(doc)
+        try:
+            for collection, docs in by_collection.items():
+                await self._insert(collection, docs)
+        except PyMongoError as e:
+            self.totals["failures"] += 1
+            logger.warning(f"Write-behind flush of {len(batch)} documents failed, will retry: {e}")
+            self._buffer[:0] = batch
+            return 0
+        except asyncio.CancelledError:
+            self._buffer[:0] = batch
+            raise
+
+        sealed, self._sealed = self._sealed, []
+        for path in sealed:
+            await asyncio.to_thread(path.unlink, missing_ok=True)
+        self.totals["batches"] += 1
+        logger.debug(f"Flushed {len(batch)} submissions in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return len(batch)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wanted.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wanted.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    async def stop(self):
+        """Journal and flush what is queued, then stop the background tasks"""
+        # Holding the lock keeps a journal write from being cut off halfway
+        async with self._segment_lock:
+            for task in self._tasks:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._incoming:
+            await self._write_journal()
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final write-behind flush failed, the journal will be replayed: {e}")
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+
+    def stats(self) -> dict:
+        return {**self.totals, "pending": self.pending, "journalSegments": len(self._sealed) + 1}
@@ -1,6 +1,7 @@
 import React from 'react';
 import { Link } from 'react-router-dom';
 import { useData } from '../../context/DataContext';
+import { imageVariant } from '../../lib/utils';
 
 const Categories = () => {
   const { categories } = useData();
@@ -28,7 +29,7 @@ const Categories = () => {
                 {/* Image Container - Slightly smaller */}
                 <div className="aspect-[5/4] overflow-hidden">
                   <img
-                    src={category.image}
+                    src={imageVariant(category.image, 300)}
                     alt={category.name}
                     className="w-full h-full object-cover transform group-hover:scale-105 transition-transform duration-500"
                   />
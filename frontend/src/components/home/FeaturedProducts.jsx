@@ -2,6 +2,7 @@ import React, { useRef } from 'react';
 import { Link } from 'react-router-dom';
 import { ChevronLeft, ChevronRight, Eye } from 'lucide-react';
 import { useData } from '../../context/DataContext';
+import { imageVariant } from '../../lib/utils';
 
 const FeaturedProducts = () => {
   const { products } = useData();
@@ -74,7 +75,7 @@ const FeaturedProducts = () => {
                 <div className="bg-white rounded-2xl overflow-hidden border border-gray-100 hover:border-[#C1E899] shadow-sm hover:shadow-lg transition-all duration-300">
                   <div className="relative overflow-hidden aspect-square bg-gray-50">
                     <img
-                      src={product.image}
+                      src={imageVariant(product.image, 600)}
                       alt={product.name}
                       className="w-full h-full object-cover transform group-hover:scale-110 transition-transform duration-500"
                     />
@@ -2,6 +2,7 @@ import React, { useRef } from 'react';
 import { Link } from 'react-router-dom';
 import { ChevronLeft, ChevronRight } from 'lucide-react';
 import { useData } from '../../context/DataContext';
+import { imageVariant } from '../../lib/utils';
 
 const GiftBoxes = () => {
   const { giftBoxes } = useData();
@@ -72,7 +73,7 @@ const GiftBoxes = () => {
                 <div className="bg-white rounded-2xl overflow-hidden shadow-md hover:shadow-xl transition-all duration-300">
                   <div className="relative overflow-hidden aspect-square">
                     <img
-                      src={box.image}
+                      src={imageVariant(box.image, 600)}
                       alt={box.name}
                       className="w-full h-full object-cover transform group-hover:scale-110 transition-transform duration-500"
                     />
@@ -1,6 +1,7 @@
 import React from 'react';
 import { Link } from 'react-router-dom';
 import { Eye } from 'lucide-react';
+import { imageVariant } from '../../lib/utils';
 
 const ProductCard = ({ product }) => {
   return (
@@ -11,7 +12,7 @@ const ProductCard = ({ product }) => {
       <div className="bg-white rounded-2xl overflow-hidden border border-gray-100 hover:border-[#C1E899] shadow-sm hover:shadow-lg transition-all duration-300">
         <div className="relative overflow-hidden aspect-square bg-gray-50">
           <img
-            src={product.image}
+            src={imageVariant(product.image, 600)}
             alt={product.name}
             className="w-full h-full object-cover transform group-hover:scale-110 transition-transform duration-500"
           />
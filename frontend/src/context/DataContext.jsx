@@ -82,29 +82,24 @@ export const DataProvider = ({ children }) => {
 
   const fetchAllData = async () => {
     try {
-      const [catRes, prodRes, heroRes, testRes, giftRes, settingsRes] = await Promise.all([
-        axios.get(`${API}/categories`).catch(() => ({ data: [] })),
-        axios.get(`${API}/products`).catch(() => ({ data: [] })),
-        axios.get(`${API}/hero-slides`).catch(() => ({ data: [] })),
-        axios.get(`${API}/testimonials`).catch(() => ({ data: [] })),
-        axios.get(`${API}/gift-boxes`).catch(() => ({ data: [] })),
-        axios.get(`${API}/site-settings`).catch(() => ({ data: {} }))
-      ]);
+      // One request for all storefront data; revalidated via ETag on reload
+      const { data } = await axios.get(`${API}/bootstrap`).catch(() => ({ data: {} }));
 
-      setCategories(catRes.data);
-      setProducts(prodRes.data);
-      setHeroSlides(heroRes.data);
-      setTestimonials(testRes.data);
-      setGiftBoxes(giftRes.data);
-      if (settingsRes.data && Object.keys(settingsRes.data).length > 0) {
-        setSiteSettings(settingsRes.data);
+      setCategories(data.categories || []);
+      setProducts(data.products || []);
+      setHeroSlides(data.heroSlides || []);
+      setTestimonials(data.testimonials || []);
+      setGiftBoxes(data.giftBoxes || []);
+      const settings = data.siteSettings;
+      if (settings && Object.keys(settings).length > 0) {
+        setSiteSettings(settings);
         // Apply theme CSS variables
-        if (settingsRes.data.theme) {
-          applyThemeCSS(settingsRes.data.theme);
+        if (settings.theme) {
+          applyThemeCSS(settings.theme);
         }
         // Apply page-specific CSS styles
-        if (settingsRes.data.pageStyles) {
-          applyPageStyles(settingsRes.data.pageStyles);
+        if (settings.pageStyles) {
+          applyPageStyles(settings.pageStyles);
         }
       }
     } catch (error) {
@@ -4,3 +4,9 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// Resized WebP rendition of an uploaded image; other URLs are returned unchanged
+export function imageVariant(url, width) {
+  if (!url || !url.includes("/api/uploads/") || url.includes("?")) return url;
+  return `${url}?w=${width}&fmt=webp`;
+}
@@ -1,5 +1,6 @@
-import React, { useState, useMemo } from 'react';
+import React, { useState, useMemo, useEffect } from 'react';
 import { useSearchParams, Link } from 'react-router-dom';
+import axios from 'axios';
 import { ChevronRight, Filter, X, SlidersHorizontal } from 'lucide-react';
 import Header from '../components/layout/Header';
 import Footer from '../components/layout/Footer';
@@ -7,22 +8,12 @@ import ProductCard from '../components/product/ProductCard';
 import ProductDetailModal from '../components/product/ProductDetailModal';
 import { useData } from '../context/DataContext';
 
-const productTypes = [
-  "Almonds",
-  "Cashews",
-  "Roasted Cashews",
-  "Walnuts",
-  "Raisins",
-  "Mix dry fruits",
-  "Pistachios",
-  "Makhana",
-  "Dried Fig",
-  "Pumpkin Seeds",
-  "Sunflower Seeds"
-];
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 24;
 
 const ProductList = () => {
-  const { products, categories } = useData();
+  const { categories } = useData();
   const [searchParams] = useSearchParams();
   const categorySlug = searchParams.get('category');
   const searchQuery = searchParams.get('search');
@@ -31,50 +22,57 @@ const ProductList = () => {
   const [sortBy, setSortBy] = useState('default');
   const [isFilterOpen, setIsFilterOpen] = useState(false);
   const [selectedProduct, setSelectedProduct] = useState(null);
-
-  const filteredProducts = useMemo(() => {
-    let result = [...products];
-
-    // Filter by category
-    if (categorySlug) {
-      result = result.filter(p => p.category === categorySlug);
-    }
-
-    // Filter by search
-    if (searchQuery) {
-      const query = searchQuery.toLowerCase();
-      result = result.filter(p => 
-        p.name.toLowerCase().includes(query) ||
-        p.type.toLowerCase().includes(query) ||
-        p.category.toLowerCase().includes(query)
-      );
-    }
-
-    // Filter by type
-    if (selectedType) {
-      result = result.filter(p => p.type === selectedType);
+  const [filteredProducts, setFilteredProducts] = useState([]);
+  const [totalProducts, setTotalProducts] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [facets, setFacets] = useState({ types: [] });
+
+  // Filtering, sorting and paging happen on the server
+  const queryParams = useMemo(() => {
+    const params = { sort: sortBy, limit: PAGE_SIZE, minPrice: priceRange[0], maxPrice: priceRange[1] };
+    if (categorySlug) params.category = categorySlug;
+    if (searchQuery) params.q = searchQuery;
+    if (selectedType) params.type = selectedType;
+    return params;
+  }, [categorySlug, searchQuery, selectedType, priceRange, sortBy]);
+
+  useEffect(() => {
+    let cancelled = false;
+    axios.get(`${API}/products`, { params: queryParams })
+      .then(({ data }) => {
+        if (cancelled) return;
+        setFilteredProducts(data.items);
+        setTotalProducts(data.total);
+        setNextCursor(data.nextCursor);
+      })
+      .catch((error) => console.error('Error fetching products:', error));
+    return () => { cancelled = true; };
+  }, [queryParams]);
+
+  // Type options and their counts for the current filters
+  useEffect(() => {
+    let cancelled = false;
+    const { sort, limit, ...filters } = queryParams;
+    axios.get(`${API}/products/facets`, { params: filters })
+      .then(({ data }) => { if (!cancelled) setFacets(data); })
+      .catch((error) => console.error('Error fetching facets:', error));
+    return () => { cancelled = true; };
+  }, [queryParams]);
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const { data } = await axios.get(`${API}/products`, { params: { ...queryParams, after: nextCursor } });
+      setFilteredProducts(prev => [...prev, ...data.items]);
+      setTotalProducts(data.total);
+      setNextCursor(data.nextCursor);
+    } catch (error) {
+      console.error('Error fetching products:', error);
+    } finally {
+      setLoadingMore(false);
     }
-
-    // Filter by price
-    result = result.filter(p => p.basePrice >= priceRange[0] && p.basePrice <= priceRange[1]);
-
-    // Sort
-    switch (sortBy) {
-      case 'price-low':
-        result.sort((a, b) => a.basePrice - b.basePrice);
-        break;
-      case 'price-high':
-        result.sort((a, b) => b.basePrice - a.basePrice);
-        break;
-      case 'name':
-        result.sort((a, b) => a.name.localeCompare(b.name));
-        break;
-      default:
-        break;
-    }
-
-    return result;
-  }, [products, categorySlug, searchQuery, selectedType, priceRange, sortBy]);
+  };
 
   const currentCategory = categories.find(c => c.slug === categorySlug);
 
@@ -172,8 +170,8 @@ const ProductList = () => {
                     className="w-full p-3 border border-gray-200 rounded-lg focus:ring-2 focus:ring-[#8BC34A] focus:border-[#8BC34A] outline-none"
                   >
                     <option value="">All Types</option>
-                    {productTypes.map((type) => (
-                      <option key={type} value={type}>{type}</option>
+                    {facets.types.map(({ value, count }) => (
+                      <option key={value} value={value}>{value} ({count})</option>
                     ))}
                   </select>
                 </div>
@@ -199,18 +197,31 @@ const ProductList = () => {
             <div className="flex-1">
               <div className="flex items-center justify-between mb-6">
                 <p className="text-gray-600">
-                  Showing <span className="font-semibold text-gray-800">{filteredProducts.length}</span> products
+                  Showing <span className="font-semibold text-gray-800">{filteredProducts.length}</span> of <span className="font-semibold text-gray-800">{totalProducts}</span> products
                 </p>
               </div>
 
               {filteredProducts.length > 0 ? (
-                <div className="grid grid-cols-2 md:grid-cols-3 xl:grid-cols-4 gap-4 md:gap-6">
-                  {filteredProducts.map((product) => (
-                    <div key={product.id} onClick={() => setSelectedProduct(product)}>
-                      <ProductCard product={product} />
+                <>
+                  <div className="grid grid-cols-2 md:grid-cols-3 xl:grid-cols-4 gap-4 md:gap-6">
+                    {filteredProducts.map((product) => (
+                      <div key={product.id} onClick={() => setSelectedProduct(product)}>
+                        <ProductCard product={product} />
+                      </div>
+                    ))}
+                  </div>
+                  {nextCursor && (
+                    <div className="text-center mt-8">
+                      <button
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                        className="bg-[#8BC34A] hover:bg-[#689F38] text-white font-medium py-3 px-8 rounded-lg transition-colors disabled:opacity-50"
+                      >
+                        {loadingMore ? 'Loading...' : 'Load More'}
+                      </button>
                     </div>
-                  ))}
-                </div>
+                  )}
+                </>
               ) : (
                 <div className="bg-white rounded-xl p-12 text-center">
                   <p className="text-gray-500 text-lg">No products found matching your criteria.</p>
@@ -1,10 +1,14 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
+import axios from 'axios';
 import { ChevronRight, Phone, MessageCircle, Heart, Truck, Shield, RefreshCcw } from 'lucide-react';
 import Header from '../components/layout/Header';
 import Footer from '../components/layout/Footer';
 import { useData } from '../context/DataContext';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
 const sizeVariants = [
   { key: '100g', label: "100 gram", multiplier: 1 },
   { key: '250g', label: "250 gram", multiplier: 2.4 },
@@ -16,12 +20,33 @@ const sizeVariants = [
 
 const ProductPage = () => {
   const { slug } = useParams();
-  const { products, siteSettings } = useData();
+  const { siteSettings } = useData();
   const [selectedSize, setSelectedSize] = useState(0);
   const [activeTab, setActiveTab] = useState('description');
   const [selectedImage, setSelectedImage] = useState(0);
+  const [product, setProduct] = useState(null);
+  const [loadingProduct, setLoadingProduct] = useState(true);
+
+  // Resolve the pretty URL with a single small request
+  useEffect(() => {
+    let cancelled = false;
+    setLoadingProduct(true);
+    axios.get(`${API}/products/by-slug/${encodeURIComponent(slug)}`)
+      .then(({ data }) => { if (!cancelled) setProduct(data); })
+      .catch(() => { if (!cancelled) setProduct(null); })
+      .finally(() => { if (!cancelled) setLoadingProduct(false); });
+    return () => { cancelled = true; };
+  }, [slug]);
 
-  const product = products.find(p => p.slug === slug);
+  if (loadingProduct) {
+    return (
+      <div className="min-h-screen bg-gray-50">
+        <Header />
+        <div className="max-w-7xl mx-auto px-4 py-16 text-center text-gray-500">Loading...</div>
+        <Footer />
+      </div>
+    );
+  }
 
   if (!product) {
     return (
@@ -4,6 +4,7 @@ import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const BULK_PAGE_SIZE = 50;
 
 const SubmissionsManager = () => {
   const [activeTab, setActiveTab] = useState('bulk');
@@ -12,19 +13,39 @@ const SubmissionsManager = () => {
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedOrder, setSelectedOrder] = useState(null);
+  const [bulkFilters, setBulkFilters] = useState({ status: '', createdFrom: '', createdTo: '' });
+  const [bulkTotal, setBulkTotal] = useState(0);
+  const [bulkCursor, setBulkCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchData();
-  }, []);
+  }, [bulkFilters]);
+
+  // The listing is paged: X-Next-Cursor continues after the last row returned
+  const fetchBulkOrders = (after) => {
+    const params = { limit: BULK_PAGE_SIZE };
+    Object.entries(bulkFilters).forEach(([key, value]) => {
+      if (value) params[key] = value;
+    });
+    if (after) params.after = after;
+    return axios.get(`${API}/bulk-orders`, { params });
+  };
+
+  const applyBulkPage = (res, append) => {
+    setBulkOrders(prev => append ? [...prev, ...res.data] : res.data);
+    setBulkTotal(Number(res.headers['x-total-count'] ?? res.data.length));
+    setBulkCursor(res.headers['x-next-cursor'] || null);
+  };
 
   const fetchData = async () => {
     setLoading(true);
     try {
       const [bulkRes, newsRes] = await Promise.all([
-        axios.get(`${API}/bulk-orders`),
+        fetchBulkOrders(),
         axios.get(`${API}/newsletter`)
       ]);
-      setBulkOrders(bulkRes.data);
+      applyBulkPage(bulkRes, false);
       setNewsletters(newsRes.data);
     } catch (error) {
       console.error('Error fetching data:', error);
@@ -33,6 +54,21 @@ const SubmissionsManager = () => {
     }
   };
 
+  const loadMoreBulkOrders = async () => {
+    setLoadingMore(true);
+    try {
+      applyBulkPage(await fetchBulkOrders(bulkCursor), true);
+    } catch (error) {
+      console.error('Error fetching data:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const updateBulkFilter = (key, value) => {
+    setBulkFilters({ ...bulkFilters, [key]: value });
+  };
+
   const updateBulkOrderStatus = async (orderId, status) => {
     try {
       await axios.put(`${API}/bulk-orders/${orderId}?status=${status}`);
@@ -47,6 +83,7 @@ const SubmissionsManager = () => {
     try {
       await axios.delete(`${API}/bulk-orders/${orderId}`);
       setBulkOrders(bulkOrders.filter(o => o.id !== orderId));
+      setBulkTotal(total => Math.max(0, total - 1));
     } catch (error) {
       console.error('Error deleting:', error);
     }
@@ -62,22 +99,16 @@ const SubmissionsManager = () => {
     }
   };
 
-  const exportToCSV = (data, filename) => {
-    if (data.length === 0) {
-      alert('No data to export');
-      return;
+  // The server streams every matching row, not just the pages loaded here
+  const exportToCSV = () => {
+    const params = new URLSearchParams({ format: 'csv' });
+    if (activeTab === 'bulk') {
+      Object.entries(bulkFilters).forEach(([key, value]) => {
+        if (value) params.set(key, value);
+      });
     }
-
-    const headers = Object.keys(data[0]).filter(k => k !== 'id');
-    const csvContent = [
-      headers.join(','),
-      ...data.map(row => headers.map(h => `"${(row[h] || '').toString().replace(/"/g, '""')}"`).join(','))
-    ].join('\n');
-
-    const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
     const link = document.createElement('a');
-    link.href = URL.createObjectURL(blob);
-    link.download = `${filename}_${new Date().toISOString().split('T')[0]}.csv`;
+    link.href = `${API}/${activeTab === 'bulk' ? 'bulk-orders' : 'newsletter'}/export?${params}`;
     link.click();
   };
 
@@ -134,7 +165,7 @@ const SubmissionsManager = () => {
           }`}
         >
           <Package className="w-5 h-5" />
-          Bulk Orders ({bulkOrders.length})
+          Bulk Orders ({bulkTotal})
         </button>
         <button
           onClick={() => setActiveTab('newsletter')}
@@ -163,6 +194,35 @@ const SubmissionsManager = () => {
             />
           </div>
         </div>
+        {activeTab === 'bulk' && (
+          <div className="flex flex-wrap items-center gap-2">
+            <Filter className="w-5 h-5 text-gray-400" />
+            <select
+              value={bulkFilters.status}
+              onChange={(e) => updateBulkFilter('status', e.target.value)}
+              className="border rounded-lg px-3 py-2 focus:ring-2 focus:ring-[#8BC34A] outline-none"
+            >
+              <option value="">All statuses</option>
+              <option value="new">New</option>
+              <option value="contacted">Contacted</option>
+              <option value="completed">Completed</option>
+            </select>
+            <input
+              type="date"
+              value={bulkFilters.createdFrom}
+              onChange={(e) => updateBulkFilter('createdFrom', e.target.value)}
+              className="border rounded-lg px-3 py-2 focus:ring-2 focus:ring-[#8BC34A] outline-none"
+              title="From"
+            />
+            <input
+              type="date"
+              value={bulkFilters.createdTo}
+              onChange={(e) => updateBulkFilter('createdTo', e.target.value)}
+              className="border rounded-lg px-3 py-2 focus:ring-2 focus:ring-[#8BC34A] outline-none"
+              title="To"
+            />
+          </div>
+        )}
         <button
           onClick={fetchData}
           className="flex items-center gap-2 px-4 py-2 bg-gray-100 hover:bg-gray-200 rounded-lg transition-colors"
@@ -171,10 +231,7 @@ const SubmissionsManager = () => {
           Refresh
         </button>
         <button
-          onClick={() => exportToCSV(
-            activeTab === 'bulk' ? bulkOrders : newsletters,
-            activeTab === 'bulk' ? 'bulk_orders' : 'newsletter_subscriptions'
-          )}
+          onClick={exportToCSV}
           className="flex items-center gap-2 px-4 py-2 bg-green-600 hover:bg-green-700 text-white rounded-lg transition-colors"
         >
           <Download className="w-5 h-5" />
@@ -254,6 +311,17 @@ const SubmissionsManager = () => {
                   </table>
                 </div>
               )}
+              {bulkCursor && (
+                <div className="p-4 border-t text-center">
+                  <button
+                    onClick={loadMoreBulkOrders}
+                    disabled={loadingMore}
+                    className="px-4 py-2 bg-gray-100 hover:bg-gray-200 rounded-lg transition-colors disabled:opacity-50"
+                  >
+                    {loadingMore ? 'Loading...' : `Load More (${bulkOrders.length} of ${bulkTotal})`}
+                  </button>
+                </div>
+              )}
             </div>
           )}
 